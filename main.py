@@ -6,6 +6,7 @@ import random
 from pulp import CPLEX_CMD
 
 from src.bay_assignment import LPSolver, make_data_serializable
+from src.run_store import RunData, write_run
 from src.flight_schedule import Scheduler
 from src.graphics import *
 
@@ -19,8 +20,13 @@ def remove_clone_logs():
 def main(n_flights : int = 50,
          logging_data : List[str] = [],
          cplex_path: str = r"C:\Program Files\IBM\ILOG\CPLEX_Studio1210\cplex\bin\x64_win64\cplex.exe",
-         schedule: Scheduler = None):
+         schedule: Scheduler = None,
+         backend: str = "pulp",
+         output: str = "json",
+         **options):
 
+    # backend="highs" solves in-process with HiGHS and needs neither CPLEX nor an LP file, without a CPLEX
+    # installation at cplex_path the pulp backend falls back to CBC; time_limit, threads and mip_gap reach either
     start = time.time()
     CPLEX_time = LPSolver(
         nflights=n_flights,
@@ -28,19 +34,38 @@ def main(n_flights : int = 50,
         solver=CPLEX_CMD(
             path=cplex_path,
             msg=False,
-        )
+        ) if backend == "pulp" and os.path.exists(cplex_path) else None,
+        backend=backend,
+        **options
     )
     diff = (time.time() - start)
-    remove_clone_logs()
-    try:
-        os.rename("BayAssignmentProblem.lp", "outputdata/BayAssignmentProblem.lp")
-    except FileExistsError:
-        os.replace("BayAssignmentProblem.lp", "outputdata/BayAssignmentProblem.lp")
+    if backend == "pulp":
+        remove_clone_logs()
+    # heuristic="only" never builds an LP file
+    if backend == "pulp" and os.path.exists("BayAssignmentProblem.lp"):
+        try:
+            os.rename("BayAssignmentProblem.lp", "outputdata/BayAssignmentProblem.lp")
+        except FileExistsError:
+            os.replace("BayAssignmentProblem.lp", "outputdata/BayAssignmentProblem.lp")
+
+    if output == "npz":
+        # typed columns plus a small manifest, the returned RunData only loads what the caller reads
+        instrument = CPLEX_time.return_instrument()
+        path = write_run(fr'./outputdata/run_{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}',
+                         CPLEX_time.return_schedule(), CPLEX_time.return_variables(),
+                         objective=CPLEX_time.return_objective(), status=CPLEX_time.return_status(),
+                         solvetime=CPLEX_time.return_solvetime(),
+                         instrument=None if instrument is None else instrument.report())
+        return RunData(path), None, diff
 
     raw_data = CPLEX_time.return_data(
         *logging_data
     )
     data = make_data_serializable(raw_data)
+    # phase timers and row counts when the run was started with an Instrument
+    instrument = CPLEX_time.return_instrument()
+    if instrument is not None:
+        data["instrument"] = instrument.report()
 
     with open(fr'./outputdata/run_{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}.json', 'w+') as file:
         file.write(json.dumps(data))
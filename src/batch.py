@@ -0,0 +1,125 @@
+"""
+Batch runner for multi-seed experiments
+Every (seed, nflights, parameters) job runs on a worker process inside its own scratch directory, so the LP file
+and solver logs of parallel runs never collide, and the per-run results are collected into one summary
+"""
+import os
+import time
+import json
+import random
+import shutil
+import tempfile
+from datetime import datetime
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+
+from pulp import CPLEX_CMD
+
+from src.bay_assignment import LPSolver, make_data_serializable
+from src.flight_schedule import Scheduler
+
+
+def make_jobs(seeds: list, nflights: list, params: list = None):
+    # full grid of seeds x instance sizes x parameter sets, params are extra LPSolver keyword arguments
+    return [{"seed": seed, "nflights": n, "params": dict(p)} for seed, n, p in product(seeds, nflights, params or [{}])]
+
+
+def run_job(job: dict, data_dir: str, scratch: str, threads: int = None, cplex_path: str = None, keep: bool = False):
+    # worker: solves one job inside its scratch directory and returns a flat result record
+    cwd = os.getcwd()
+    os.makedirs(scratch, exist_ok=True)
+    os.chdir(scratch)
+    start = time.perf_counter()
+    try:
+        random.seed(job["seed"])
+        schedule = Scheduler(job["nflights"], ac_file=os.path.join(data_dir, "ac.json"),
+                             terminal_file=os.path.join(data_dir, "terminals.json"),
+                             feature_file=os.path.join(data_dir, "features.json"),
+                             schedule_file=os.path.join(data_dir, "scheduling.json"))
+        params = dict(job["params"])
+        # a job may override the worker's thread budget, SciPy's HiGHS has no thread option so it gets none;
+        # LPSolver applies threads to a solver given in the job's params as well
+        threads = params.pop("threads", None if params.get("backend", "pulp") == "highs" else threads)
+        if cplex_path is not None and params.get("backend", "pulp") == "pulp":
+            params.setdefault("solver", CPLEX_CMD(path=cplex_path, msg=False, threads=threads))
+        lp = LPSolver(nflights=job["nflights"], schedule=schedule, adj_file=os.path.join(data_dir, "adj.json"),
+                      threads=threads, **params)
+        variables = lp.return_variables()
+        result = dict(job, threads=threads, status=lp.return_status(),
+                      objective=lp.return_objective(), solvetime=lp.return_solvetime(),
+                      tows=len(variables['w']), nobay=len(variables['y']), error=None)
+        if keep:
+            with open("run.json", 'w') as file:
+                file.write(json.dumps(make_data_serializable(lp.return_data('variables', 'problem'))))
+    except Exception as error:
+        result = dict(job, threads=threads, status="Error", objective=None, solvetime=None, tows=None, nobay=None,
+                      error=repr(error))
+    finally:
+        os.chdir(cwd)
+        if not keep:
+            shutil.rmtree(scratch, ignore_errors=True)
+    result["runtime"] = time.perf_counter() - start
+    result["scratch"] = scratch if keep else None
+    return result
+
+
+class BatchRunner(object):
+    def __init__(self, jobs: list, processes: int = None, threads: int = None, cplex_path: str = None,
+                 data_dir: str = r"./programdata", scratch_dir: str = None, keep: bool = False):
+        # threads is the solver thread budget per worker for the pulp backend (CBC/CPLEX), by default the cores are
+        # split evenly over the workers; HiGHS jobs run without a budget, "threads" in a job's params overrides it
+        self.__jobs = jobs
+        self.__processes = processes or min(len(jobs), os.cpu_count() or 1) or 1
+        self.__threads = threads or max(1, (os.cpu_count() or 1) // self.__processes)
+        self.__cplex_path = cplex_path
+        self.__data_dir = os.path.abspath(data_dir)
+        self.__scratch_dir = tempfile.mkdtemp(prefix="batch_") if scratch_dir is None else os.path.abspath(scratch_dir)
+        self.__keep = keep
+
+        start = time.perf_counter()
+        self.__results = self.run()
+        self.__runtime = time.perf_counter() - start
+        if not keep:
+            shutil.rmtree(self.__scratch_dir, ignore_errors=True)
+
+    def run(self):
+        with ProcessPoolExecutor(max_workers=self.__processes) as pool:
+            futures = [pool.submit(run_job, job, self.__data_dir, os.path.join(self.__scratch_dir, "job_%s" % n),
+                                   self.__threads, self.__cplex_path, self.__keep)
+                       for n, job in enumerate(self.__jobs)]
+            return [future.result() for future in futures]
+
+    def return_results(self):
+        return self.__results
+
+    def return_runtime(self):
+        return self.__runtime
+
+    def return_summary(self):
+        # mean objective and solve time per instance size and parameter set over all seeds that solved
+        groups = {}
+        for r in self.__results:
+            key = (r["nflights"], json.dumps(r["params"], sort_keys=True, default=str))
+            groups.setdefault(key, []).append(r)
+        summary = []
+        for (n, params), runs in groups.items():
+            solved = [r for r in runs if r["objective"] is not None]
+            summary.append({"nflights": n, "params": json.loads(params), "runs": len(runs), "solved": len(solved),
+                            "objective": sum(r["objective"] for r in solved) / len(solved) if solved else None,
+                            "solvetime": sum(r["solvetime"] for r in solved) / len(solved) if solved else None,
+                            "runtime": sum(r["runtime"] for r in runs) / len(runs)})
+        return summary
+
+    def write(self, path: str = None):
+        path = fr'./outputdata/batch_{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}.json' if path is None else path
+        with open(path, 'w+') as file:
+            file.write(json.dumps({"processes": self.__processes, "threads": self.__threads,
+                                   "runtime": self.__runtime, "summary": self.return_summary(),
+                                   "results": self.__results}, default=str))
+        return path
+
+
+if __name__ == "__main__":
+    batch = BatchRunner(make_jobs(seeds=[2021, 299, 9999], nflights=[20, 40], params=[{"backend": "highs"}]))
+    for row in batch.return_summary():
+        print(row)
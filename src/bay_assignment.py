@@ -4,15 +4,22 @@ Authors: Mauro, Luke   2020
 """
 # Importing modules
 import time
+from copy import copy
 import os, json
-from collections import defaultdict, ChainMap
+from collections import defaultdict
+from collections.abc import Mapping
 
-from pulp import LpProblem, LpMinimize, lpSum, LpInteger, LpVariable, LpStatus, value, CPLEX_CMD
+from pulp import LpProblem, LpMinimize, lpSum, LpInteger, LpVariable, LpConstraint, value, CPLEX_CMD, \
+    PULP_CBC_CMD, LpSolver as PulpSolver
 from datetime import datetime, timedelta
 
 from typing import List
 
 from src.flight_schedule import Scheduler, return_data
+from src.intervals import IntervalIndex, IntervalSet
+from src.compat import CompatIndex, adj_table
+from src.matrix_model import lp_matrices, solve_highs, highs_status, status_name
+from src.instrument import Instrument, phase
 
 
 def is_jsonable(x):
@@ -27,8 +34,10 @@ def make_data_serializable(data: dict):
     result = {}
     for key, value in data.items():
         key = str(key)
-        if isinstance(value, dict):
+        if isinstance(value, Mapping):
             result[key] = make_data_serializable(value)
+        elif value is None or isinstance(value, (str, int, float)):
+            result[key] = value
         elif isinstance(value, datetime):
             date_time = value.strftime("%Y/%m/%d %H:%M:%S")
             result[key] = date_time
@@ -36,14 +45,18 @@ def make_data_serializable(data: dict):
             result[key] = str(value)
         elif isinstance(value, LpVariable):
             result[key] = value.name
-        elif isinstance(value, CPLEX_CMD):
+        elif isinstance(value, LpConstraint):
+            # PuLP 3 constraints wrap their expression instead of being one, stored as before as variable -> coefficient
+            result[key] = make_data_serializable(value.expr)
+        elif isinstance(value, PulpSolver):
+            # CPLEX_CMD, the CBC built from time_limit/threads/mip_gap or any other PuLP solver
             continue
         else:
             if is_jsonable(value):
                 result[key] = value
             else:
                 if isinstance(value, list):
-                    result[key] = [vi.__dict__ for vi in value]
+                    result[key] = [make_data_serializable(vi.__dict__) for vi in value]
                 else:
                     result[key] = value
 
@@ -56,6 +69,31 @@ def flight_check(flights: list):
     return not flights or flights.count(flights[0]) == len(flights)
 
 
+def base_flight(flight: str):
+    return flight.rstrip("PAD")
+
+
+def select_flights(result: dict, flights: set):
+    # part of a solve() result that belongs to the given base flights
+    return {'w': {l: v for l, v in result['w'].items() if str(l) in flights},
+            'x': {i: v for i, v in result['x'].items() if base_flight(i) in flights},
+            'y': {i: v for i, v in result['y'].items() if str(i) in flights}}
+
+
+def turn_cost(turn: str, data: dict, cap: int, ter: str, k: int, bays: dict, ter_penalty: float):
+    # objective coefficient of a turn on bay k of terminal ter, a preferred bay divides the cost by its value
+    if "P" in turn:
+        return 1
+    a = 2 if ("A" in turn) or ("D" in turn) else 1
+    if data["ter"] == ter or ter == "BUS":
+        cost = cap * bays[ter][k]["dist"] / a
+    else:
+        cost = ter_penalty * cap * bays[ter][k]["dist"] / a
+    if "pref" in data and (data["pref"]["ter"], data["pref"]["bay"]) == (ter, k):
+        cost = cost / data["pref"]["val"]
+    return cost
+
+
 def solve_time(n: int, nflights: int, solver):
     solve_times = []
     for i in range(n):
@@ -66,13 +104,51 @@ def solve_time(n: int, nflights: int, solver):
 
 class LPSolver(object):
     def __init__(self, nflights: int, solver=None, date: datetime = datetime(2010, 6, 15), tbuf: dict = None,
-                 plotting: bool = False, adj_file: str = r"./programdata/adj.json", schedule: Scheduler = None):
-
-        self.__schedule = Scheduler(nflights, date=date, plotting=plotting) if schedule is None else schedule
+                 plotting: bool = False, adj_file: str = r"./programdata/adj.json", schedule: Scheduler = None,
+                 time_cliques: bool = False, backend: str = "pulp", time_limit: float = None, threads: int = None,
+                 mip_gap: float = None, heuristic: str = None, fixed: dict = None, offsets: dict = None,
+                 instrument: Instrument = None, symmetry: bool = False):
+
+        # opt-in phase timers and row counts, see src/instrument.py
+        self.__instrument = instrument
+        self.__schedule = Scheduler(nflights, date=date, plotting=plotting, instrument=instrument) \
+            if schedule is None else schedule
         if tbuf is None:
             tbuf = timedelta(minutes=15)
         self.__tbuf = tbuf
+        # "pulp" solves through the PuLP solver command, "highs" solves in-process without any file I/O
+        self.__backend = backend
+        self.__time_limit = time_limit
+        self.__mip_gap = mip_gap
+        if backend == "highs" and threads is not None:
+            raise ValueError("threads only applies to the pulp backend, SciPy's HiGHS has no thread option")
+        if solver is None and backend == "pulp" and (time_limit, threads, mip_gap) != (None, None, None):
+            solver = PULP_CBC_CMD(msg=False, timeLimit=time_limit, threads=threads, gapRel=mip_gap)
+        elif solver is not None and (time_limit, threads, mip_gap) != (None, None, None):
+            # a given solver (e.g. CPLEX_CMD) takes the limits too, on a copy so the caller's solver is left as is
+            solver = copy(solver)
+            solver.timeLimit = solver.timeLimit if time_limit is None else time_limit
+            solver.optionsDict = dict(solver.optionsDict)
+            for key, val in [("threads", threads), ("gapRel", mip_gap)]:
+                if val is not None:
+                    solver.optionsDict[key] = val
         self.__solver = solver
+        # one "at most one turn per bay" row per maximal overlap set instead of one row per overlapping pair
+        self.__time_cliques = time_cliques
+        # "start" hands the greedy assignment to the solver as MIP start, "only" returns it without solving
+        self.__heuristic = heuristic
+        self.__greedy = None
+        # assignments in solve() result format that the model has to keep
+        self.__fixed = {} if fixed is None else fixed
+        # extra objective coefficients on (turn, ter, bay), e.g. coordination prices, not part of the turn costs
+        self.__offsets = {} if offsets is None else offsets
+        # order rows for interchangeable bays (same category, size, distance and costs), see symmetries()
+        self.__symmetry = symmetry
+        self.__symmetries = []
+        # time/adjacency row names per turn and turns per row name, so single turns can be rebuilt
+        self.__index_rows = defaultdict(set)
+        self.__index_row_turns = {}
+        self.__nsets = 0
 
         self.__date_format = '%Y/%m/%d %H:%M:%S'
 
@@ -82,12 +158,14 @@ class LPSolver(object):
         self.__terminals = self.__schedule.return_termianls()
 
         self.__tow_data, self.__nobay_data, self.__ter_penalty = self.__schedule.return_cost_data()
+        # one preference value for every preferred bay instead of the drawn ones, see update_costs
+        self.__pref_val = None
 
         self.__turns = self.__schedule.return_turns()
         self.__lturns = self.__schedule.return_lturns()
-        # create chain map of all turns
-        self.__map_turns = ChainMap(self.__turns, self.__lturns["FULL"], self.__lturns["SPLIT"])
-        self.__map_fturns = ChainMap(self.__turns, self.__lturns["FULL"])
+        # one flat lookup over all turns, the records are shared with the schedule
+        self.__map_turns = {**self.__turns, **self.__lturns["FULL"], **self.__lturns["SPLIT"]}
+        self.__map_fturns = {**self.__turns, **self.__lturns["FULL"]}
 
         self.__costs_turns = defaultdict(lambda: defaultdict(dict))
         self.__costs_tows = {}
@@ -98,7 +176,13 @@ class LPSolver(object):
             self.__adj = json.load(file)
 
         self.__keys_bays = [(ter, k) for ter in self.__bays for k in self.__bays[ter]]
-        self.__keys = [(i, ter, k) for i in self.__map_turns for ter in self.__bays for k in self.__bays[ter]]
+
+        # aircraft lookup and turn x bay compatibility matrix
+        self.__index_compat = CompatIndex(self.__ac, self.__bays, self.__map_turns)
+        # only feasible (turn, terminal, bay) triples get an x-variable
+        self.__keys = [(i, ter, k) for i in self.__map_turns for ter, k in self.var_bays(flight=i)]
+        # sweep-line index over the buffered turn windows
+        self.__index_time = IntervalIndex({i: self.get_tbuf(flight=i) for i in self.__map_turns})
 
         # assign tow & unassigned bay costs to turns
         self.costs_turns()
@@ -108,59 +192,94 @@ class LPSolver(object):
         # Creates the 'prob' variable to contain the problem data
         self.__prob = LpProblem("Bay_Assignment", LpMinimize)
         self.__var_tow = LpVariable.dicts("w", ([i for i in self.__lturns["FULL"]]), 0, 1, LpInteger)
-        self.__var_turn = LpVariable.dicts("x", ([i for i in self.__map_turns], [ter for ter in self.__bays],
-                                                 [k for ter in self.__bays for k in self.__bays[ter]]), 0, 1, LpInteger)
+        self.__var_turn = {(i, ter, k): LpVariable("x_%s_%s_%s" % (i, ter, k), 0, 1, LpInteger)
+                           for (i, ter, k) in self.__keys}
         self.__var_nobay = LpVariable.dicts("y", ([i for i in self.__map_fturns]), 0, 1, LpInteger)
         self.make_objf()
         self.make_const()
 
-        self.writeLP()
+        if self.__heuristic is not None:
+            self.__greedy = self.greedy()
+            self.warm_start(self.__greedy)
+
+        if self.__backend == "pulp" and self.__heuristic != "only":
+            self.writeLP()
+
+        if self.__instrument is not None:
+            self.__instrument.count("variables", len(self.__prob.variables()))
+            self.__instrument.count("constraints", len(self.__prob.constraints))
 
         start = time.perf_counter()
-        self.__variables = self.solve(solver=self.__solver)
+        self.solve(solver=self.__solver)
+        self.__variables = self.parse_variables()
         self.__solvetime = time.perf_counter() - start
 
+    def return_instrument(self):
+        return self.__instrument
+
     def return_solvetime(self):
         return self.__solvetime
 
+    def return_schedule(self):
+        return self.__schedule
+
+    def return_problem(self):
+        return self.__prob
+
+    def return_status(self):
+        return status_name(self.__prob.status, self.__prob.sol_status)
+
+    def return_objective(self):
+        return value(self.__prob.objective)
+
+    def return_variables(self):
+        return self.__variables
+
     def ac_data(self, flight: str):
-        return self.__ac[
-            list(self.__ac.keys())[[self.__ac[x]["AC"] for x in self.__ac].index(self.__map_turns[flight]["AC"])]]
+        return self.__index_compat.turn_ac(flight)
 
+    def var_bays(self, flight: str):
+        # compatible bays, parked splits only go to remote bays and arrival/departure splits only to the terminals
+        bays = self.__index_compat.bays(flight)
+        if flight in self.__lturns["SPLIT"]:
+            park = flight.endswith("P")
+            return [(ter, k) for ter, k in bays if (ter == "BUS") == park]
+        return bays
 
+    @phase()
     def costs_turns(self):
         for i in self.__map_turns:
-            for ter, k in self.__keys_bays:
-                if "P" in i:
-                    self.__costs_turns[i][ter][k] = 1
-                else:
-                    a = 2 if ("A" in i) or ("D" in i) else 1
-                    if self.__map_turns[i]["ter"] == ter or ter == "BUS":
-                        self.__costs_turns[i][ter][k] = self.ac_data(flight=i)["cap"] * self.__bays[ter][k]["dist"] / a
-                    else:
-                        self.__costs_turns[i][ter][k] = self.__ter_penalty * self.ac_data(flight=i)["cap"] * \
-                                                        self.__bays[ter][k]["dist"] / a
-            if "pref" in self.__map_turns[i]:
-                ter_pref = self.__map_turns[i]["pref"]["ter"]
-                bay_pref = self.__map_turns[i]["pref"]["bay"]
-                pref = self.__map_turns[i]["pref"]["val"]
-                self.__costs_turns[i][ter_pref][bay_pref] = self.__costs_turns[i][ter_pref][bay_pref] / pref
-
+            cap = self.__index_compat.cap(i)
+            data = self.__map_turns[i]
+            if self.__pref_val is not None and "pref" in data:
+                data = dict(data, pref=dict(data["pref"], val=self.__pref_val))
+            for ter, k in self.var_bays(flight=i):
+                self.__costs_turns[i][ter][k] = turn_cost(i, data, cap, ter, k, self.__bays, self.__ter_penalty)
+
+    @phase()
     def costs_nobay(self, nobay_cat):
         for i in self.__turns:
-            self.__costs_nobay[i] = nobay_cat[self.ac_data(flight=i)["cat"]]
+            self.__costs_nobay[i] = nobay_cat[self.__index_compat.cat(i)]
         for l in self.__lturns["FULL"]:
-            self.__costs_nobay[l] = nobay_cat[self.ac_data(flight=l)["cat"]]
+            self.__costs_nobay[l] = nobay_cat[self.__index_compat.cat(l)]
 
+    @phase()
     def costs_tows(self, tow_cat):
         for l in self.__lturns["FULL"]:
-            self.__costs_tows[l] = tow_cat[self.ac_data(flight=l)["cat"]]
+            self.__costs_tows[l] = tow_cat[self.__index_compat.cat(l)]
+
+    def objective(self, offsets: dict = None):
+        # offsets defaults to the model's own, update_turn adds its keep="penalize" charges on top of them
+        offsets = self.__offsets if offsets is None else offsets
+        return lpSum(
+            [self.__var_turn[i, ter, k] * (self.__costs_turns[i][ter][k] + offsets.get((i, ter, k), 0))
+             for (i, ter, k) in self.__keys] +
+            [self.__var_tow[t] * self.__costs_tows[t] for t in self.__lturns["FULL"]] +
+            [self.__var_nobay[i] * self.__costs_nobay[i] for i in self.__map_fturns])
 
+    @phase()
     def make_objf(self):
-        self.__prob += lpSum(
-            [self.__var_turn[i][ter][k] * self.__costs_turns[i][ter][k] for (i, ter, k) in self.__keys] +
-            [self.__var_tow[t] * self.__costs_tows[t] for t in self.__lturns["FULL"]] +
-            [self.__var_nobay[i] * self.__costs_nobay[i] for i in self.__map_fturns]), "obj_fun"
+        self.__prob += self.objective(), "obj_fun"
 
     def make_const(self):
         self.asg_turns()
@@ -168,105 +287,417 @@ class LPSolver(object):
         self.tow_const()
         self.adj_const()
         self.time_const()
+        self.fix_const()
+        if self.__symmetry:
+            self.__symmetries = self.symmetries()
+            self.sym_const()
 
+    @phase(rows=True)
     def asg_turns(self):
         for i in self.__turns:
-            bays = defaultdict(dict)
-            for ter, k in self.__keys_bays:
-                if self.ac_data(flight=i)["cat"] in self.__bays[ter][k]["cat"]:
-                    bays[ter][k] = True
-            self.__prob += lpSum([self.__var_turn[i][ter][k] for ter in bays for k in bays[ter]] +
+            self.__prob += lpSum([self.__var_turn[i, ter, k] for ter, k in self.var_bays(flight=i)] +
                                  self.__var_nobay[i]) == 1, "AssignConstFlight%s" % i
 
+    @phase(rows=True)
     def asg_lturns(self):
         for l in self.__lturns["FULL"]:
-            bays = defaultdict(dict)
-            bays_split = defaultdict(dict)
-            bays_park = defaultdict(dict)
-            for ter, k in self.__keys_bays:
-                if self.ac_data(flight=l)["cat"] in self.__bays[ter][k]["cat"]:
-                    bays[ter][k] = True
-                    if ter != "BUS":
-                        bays_split[ter][k] = True
-                    else:
-                        bays_park[ter][k] = True
-            self.__prob += lpSum(self.__var_tow[l] + self.__var_nobay[l] + [self.__var_turn[l][ter][k] for ter in bays \
-                                                                            for k in bays[
-                                                                                ter]]) == 1, "AssignConstraintFullFlight%s" % l
-            self.__prob += lpSum(self.__var_tow[l] - [self.__var_turn[l + "P"][ter][k] for ter in bays for k in
-                                                      bays_park[ter]]) == 0, "AssignConstSplitFlight%s" % l + "P"
-            for s in ["A", "D"]:
-                self.__prob += lpSum(self.__var_tow[l] - [self.__var_turn[l + s][ter][k] for ter in bays for k in
-                                                          bays_split[ter]]) == 0, "AssignConstSplitFlight%s" % l + s
-
-    def time_const(self):
-        for idx, i1 in enumerate(list(self.__map_turns.keys())):
-            arr1, dep1 = self.get_tbuf(flight=i1)
-            for i2 in list(self.__map_turns.keys())[idx + 1:]:
-                arr2, dep2 = self.get_tbuf(flight=i2)
-                if not flight_check(flights=[i1, i2]) and ((arr1 <= arr2 <= dep1 or arr1 <= dep2 <= dep1) or
-                                                           (arr2 <= arr1 and dep2 >= dep1)):
-                    for ter, k in self.__keys_bays:
-                        if self.ac_data(flight=i1)["cat"] in self.__bays[ter][k]['cat'] and \
-                                self.ac_data(flight=i2)["cat"] in self.__bays[ter][k]["cat"]:
-                            self.__prob += lpSum(self.__var_turn[i1][ter][k] + self.__var_turn[i2][ter][k]) <= 1, \
-                                           "TimeConstTer%sBay%sFlights%s&%s" % (ter, k, i1, i2)
+            self.__prob += lpSum([self.__var_tow[l], self.__var_nobay[l]] +
+                                 [self.__var_turn[l, ter, k] for ter, k in self.var_bays(flight=l)]) == 1, \
+                           "AssignConstraintFullFlight%s" % l
+            for s in ["P", "A", "D"]:
+                self.__prob += lpSum([self.__var_tow[l]] +
+                                     [-self.__var_turn[l + s, ter, k] for ter, k in self.var_bays(flight=l + s)]) \
+                               == 0, "AssignConstSplitFlight%s" % l + s
+
+    def add_row(self, row, name: str, turns: list):
+        self.__prob += row, name
+        self.__index_row_turns[name] = turns
+        for i in turns:
+            self.__index_rows[i].add(name)
+
+    def drop_rows(self, turns: set, prefix: str = ""):
+        # removes every time/adjacency row of the turns (only those named prefix...), returns all turns that shared
+        # one of those rows
+        shared = set(turns)
+        for name in {name for i in turns for name in self.__index_rows[i] if name.startswith(prefix)}:
+            del self.__prob.constraints[name]
+            for j in self.__index_row_turns.pop(name):
+                self.__index_rows[j].discard(name)
+                shared.add(j)
+        return shared
+
+    def overlap_pairs(self, turns: set = None):
+        # overlapping turn pairs, restricted to pairs with at least one of the given turns
+        if turns is None:
+            yield from self.__index_time.pairs()
+            return
+        seen = set()
+        for i1 in turns:
+            for i2 in self.__index_time.overlapping(*self.__index_time.window(i1)):
+                if i2 != i1 and (i2, i1) not in seen:
+                    seen.add((i1, i2))
+                    yield i1, i2
+
+    @phase(rows=True)
+    def time_const(self, turns: set = None):
+        # turns limits the rows to the given turns: their cliques, or the pairs involving them
+        if self.__time_cliques:
+            for group, bays in self.__index_compat.groups():
+                for park in [False, True]:
+                    bays_var = [(ter, k) for ter, k in bays if (ter == "BUS") == park]
+                    if not bays_var:
+                        continue
+                    turns_var = {i for i in group if (i,) + bays_var[0] in self.__var_turn and
+                                 (turns is None or i in turns)}
+                    for clique in self.__index_time.cliques(keys=turns_var):
+                        if flight_check(flights=list(clique)):
+                            continue
+                        for ter, k in bays_var:
+                            # after update_turn the rows that survived may already hold the clique
+                            if turns is not None and self.covered(clique, ter, k):
+                                continue
+                            self.add_row(lpSum([self.__var_turn[i, ter, k] for i in clique]) <= 1,
+                                         "TimeConstTer%sBay%sSet%s" % (ter, k, self.__nsets), clique)
+                        self.__nsets += 1
+        else:
+            for i1, i2 in self.overlap_pairs(turns=turns):
+                if not flight_check(flights=[i1, i2]):
+                    for ter, k in self.__index_compat.common_bays(i1, i2):
+                        if (i1, ter, k) in self.__var_turn and (i2, ter, k) in self.__var_turn:
+                            self.add_row(lpSum(self.__var_turn[i1, ter, k] + self.__var_turn[i2, ter, k]) <= 1,
+                                         "TimeConstTer%sBay%sFlights%s&%s" % (ter, k, i1, i2), [i1, i2])
+
+    def covered(self, clique: list, ter: str, k: int):
+        # an existing time row of the bay holds every turn of the clique
+        prefix = "TimeConstTer%sBay%sSet" % (ter, k)
+        return any(name.startswith(prefix) and set(clique) <= set(self.__index_row_turns[name])
+                   for name in self.__index_rows[next(iter(clique))])
 
     def get_tbuf(self, flight):
         arr = self.__map_turns[flight]["ETA"]
         dep = self.__map_turns[flight]["ETD"]
         return arr + self.__tbuf, dep + self.__tbuf
 
+    @phase(rows=True)
     def tow_const(self):
         for l in self.__lturns["FULL"]:
             if self.__lturns["FULL"][l].get("tow"):
                 self.__prob += lpSum(self.__var_tow[l]) == 1, "TowConstFlight%s" % l
 
-    def adj_const(self):
-        for ter, k in self.__keys_bays:
-            if (ter, k+2) in self.__keys_bays:
-                for idx, i1 in enumerate(list(self.__map_turns.keys())):
-                    arr1, dep1 = self.get_tbuf(flight=i1)
-                    if self.ac_data(flight=i1)["cat"] in self.__bays[ter][k]['cat']:
-                        for i2 in list(self.__map_turns.keys()):
-                            arr2, dep2 = self.get_tbuf(flight=i2)
-                            if self.ac_data(flight=i2)["cat"] in self.__bays[ter][k+2]['cat'] \
-                                and not flight_check(flights=[i1, i2]) \
-                                and ((arr1 <= arr2 <= dep1 or arr1 <= dep2 <= dep1) or (arr2 <= arr1 and dep2 >= dep1)):
-                                if self.ac_data(flight=i2)["cat"] in self.__adj.get(ter, {}).get(
-                                        self.__bays[ter][k]["size"], {}) \
-                                    .get(self.__bays[ter].get(k + 2, {}).get("size"), {}).get(
-                                    self.ac_data(flight=i1)["cat"], []):
-                                    self.__prob += lpSum(self.__var_turn[i1][ter][k] + self.__var_turn[i2][ter][k + 2]) <= 1, \
-                                                   "AdjConstTer%sBay%sFlights%s&%s" % (ter, k, i1, i2)
-
-        # for idx, i1 in enumerate(list(self.__map_turns.keys())):
-        #     arr1, dep1 = self.get_tbuf(flight=i1)
-        #     for ter, k in self.__keys_bays:
-        #         for i2 in list(self.__map_turns.keys())[idx + 1:]:
-        #             arr2, dep2 = self.get_tbuf(flight=i2)
-        #             if not flight_check(flights=[i1, i2]) and ((arr1 <= arr2 <= dep1 or arr1 <= dep2 <= dep1) or
-        #                                                        (arr2 <= arr1 and dep2 >= dep1)):
-        #                 if self.ac_data(flight=i1)["cat"] in self.__bays[ter][k]['cat'] and \
-        #                         self.ac_data(flight=i2)["cat"] in self.__bays[ter].get(k + 2, {}).get('cat', []) and \
-        #                         self.ac_data(flight=i2)["cat"] in self.__adj.get(ter, {}).get(
-        #                     self.__bays[ter][k]["size"], {}) \
-        #                         .get(self.__bays[ter].get(k + 2, {}).get("size"), {}).get(
-        #                     self.ac_data(flight=i1)["cat"], []):
-        #                     self.__prob += lpSum(self.__var_turn[i1][ter][k] + self.__var_turn[i2][ter][k + 2]) == 0, \
-        #                                    "AdjConstTer%sBay%sFlights%s&%s" % (ter, k, i1, i2)
+    @phase(rows=True)
+    def adj_const(self, turns: set = None):
+        table = adj_table(self.__adj, self.__bays)
+        for i1, i2 in self.overlap_pairs(turns=turns):
+            if flight_check(flights=[i1, i2]):
+                continue
+            for f1, f2 in [(i1, i2), (i2, i1)]:
+                for ter, k in table.get((self.__index_compat.cat(f1), self.__index_compat.cat(f2)), []):
+                    if (f1, ter, k) in self.__var_turn and (f2, ter, k + 2) in self.__var_turn:
+                        self.add_row(lpSum(self.__var_turn[f1, ter, k] + self.__var_turn[f2, ter, k + 2]) <= 1,
+                                     "AdjConstTer%sBay%sFlights%s&%s" % (ter, k, f1, f2), [f1, f2])
+
+    def symmetries(self):
+        # groups of interchangeable bay copies, swapping two copies of a group maps every solution to one with the
+        # same cost: bays outside all adjacency rules swap one by one if category, size, distance and costs agree,
+        # the restricted bays of a terminal only as whole sides (odd k <-> k + 1) so the k/k+2 rows map onto themselves
+        relations = {(ter, k, pair) for pair, bays in adj_table(self.__adj, self.__bays).items() for ter, k in bays}
+        restricted = {(ter, k) for ter, k, _ in relations} | {(ter, k + 2) for ter, k, _ in relations}
+        fixed = {(x['type'], int(x['id'])) for x in self.__fixed.get('x', {}).values()}
+
+        def signature(ter, k):
+            bay = self.__bays[ter][k]
+            costs = tuple((i, self.__costs_turns[i][ter][k] + self.__offsets.get((i, ter, k), 0))
+                          for i in self.__index_compat.turns(ter, k) if (i, ter, k) in self.__var_turn)
+            return bay["size"], bay["dist"], tuple(bay["cat"]), (ter, k) if (ter, k) in fixed else None, costs
+
+        groups = []
+        for ter in self.__bays:
+            free = defaultdict(list)
+            for k in self.__bays[ter]:
+                if (ter, k) not in restricted:
+                    free[signature(ter, k)].append(k)
+            groups += [[((ter, k),) for k in ks] for ks in free.values() if len(ks) > 1]
+
+            side = [k for k in self.__bays[ter] if k % 2 and (ter, k) in restricted]
+            swap = {**{k: k + 1 for k in side}, **{k + 1: k for k in side}}
+            if side and set(swap) == {k for t, k in restricted if t == ter} and \
+                    all(signature(ter, k) == signature(ter, k + 1) for k in side) and \
+                    {(t, swap[k], pair) for t, k, pair in relations if t == ter} \
+                    == {r for r in relations if r[0] == ter}:
+                groups.append([tuple((ter, k) for k in side), tuple((ter, k + 1) for k in side)])
+        return groups
+
+    @phase(rows=True)
+    def sym_const(self):
+        # copy r + 1 of a group takes turn i only if an earlier turn sits on copy r, compared on the first bay of
+        # each copy: the copies of any solution can be permuted into this order, so the optimum is kept
+        for n, copies in enumerate(self.__symmetries):
+            lead = [copy[0] for copy in copies]
+            order = sorted((i for i in self.__map_turns if (i,) + lead[0] in self.__var_turn),
+                           key=lambda i: (self.__map_turns[i]["ETA"], i))
+            for r in range(len(lead) - 1):
+                for p, i in enumerate(order):
+                    self.__prob += lpSum(self.__var_turn[(i,) + lead[r + 1]]) <= \
+                                   lpSum([self.__var_turn[(j,) + lead[r]] for j in order[:p]]), \
+                                   "SymConstGroup%sCopy%sFlight%s" % (n, r, i)
+
+    def canonical(self, result: dict):
+        # the same assignment with the copies of every group permuted into the order of sym_const
+        x = dict(result['x'])
+        for copies in self.__symmetries:
+            lead = [copy[0] for copy in copies]
+            first = {}
+            for i, bay in x.items():
+                bay = (bay['type'], int(bay['id']))
+                if bay in lead:
+                    r = lead.index(bay)
+                    first[r] = min(first.get(r, (self.__map_turns[i]["ETA"], i)), (self.__map_turns[i]["ETA"], i))
+            order = sorted(range(len(copies)), key=lambda r: (r not in first, first.get(r), r))
+            moves = {copies[r][m]: copies[n][m] for n, r in enumerate(order) for m in range(len(copies[r]))}
+            for i, bay in x.items():
+                ter, k = moves.get((bay['type'], int(bay['id'])), (bay['type'], int(bay['id'])))
+                x[i] = {'type': ter, 'id': str(k)}
+        return dict(result, x=x)
+
+    def update_turn(self, flight: str, eta: datetime = None, etd: datetime = None, keep: str = None,
+                    penalty: float = None):
+        # re-optimise after a delay, only the time and adjacency rows of the moved turns are rebuilt
+        # the previous solution is the warm start, keep="fix" fixes all other flights and
+        # keep="penalize" charges penalty (default: the mean tow cost) for every other flight that changes bay
+        previous = self.__variables
+        changed = self.__schedule.update_flight(flight, eta=eta, etd=etd)
+        shared = self.drop_rows(set(changed))
+        self.__index_time = IntervalIndex({i: self.get_tbuf(flight=i) for i in self.__map_turns})
+        for i in changed:
+            shared.update(self.__index_time.overlapping(*self.__index_time.window(i)))
+        if self.__time_cliques:
+            # cliques are rebuilt over every turn whose clique rows touch the moved turns' neighbourhood, so each
+            # overlapping pair stays in exactly the rows a fresh build would need
+            shared = self.drop_rows(shared, prefix="TimeConst")
+        self.time_const(turns=shared if self.__time_cliques else set(changed))
+        self.adj_const(turns=set(changed))
+
+        others = {f for f in self.__map_fturns if f != flight}
+        for name in [name for name in self.__prob.constraints if name.startswith(("FixConst", "SymConst"))]:
+            del self.__prob.constraints[name]
+        self.fix_const(fixed=select_flights(previous, others) if keep == "fix" else None)
+        # the moved turn changes the turn order, kept or penalised flights are no longer interchangeable
+        if self.__symmetry:
+            self.__symmetries = self.symmetries() if keep is None else []
+            self.sym_const()
+
+        offsets = dict(self.__offsets)
+        if keep == "penalize":
+            penalty = sum(self.__tow_data.values()) / len(self.__tow_data) if penalty is None else penalty
+            for i, ter, k in self.__keys:
+                if base_flight(i) in others and i in previous['x'] and \
+                        previous['x'][i] != {'type': ter, 'id': str(k)}:
+                    offsets[i, ter, k] = offsets.get((i, ter, k), 0) + penalty
+        self.__prob.setObjective(self.objective(offsets))
+
+        if self.__heuristic is not None:
+            self.__greedy = self.greedy()
+        self.warm_start(self.__greedy if self.__heuristic == "only" else previous)
 
+        start = time.perf_counter()
+        self.solve(solver=self.__solver)
+        self.__variables = self.parse_variables()
+        self.__solvetime = time.perf_counter() - start
+        return self.__variables
+
+    def update_costs(self, tow: dict = None, nobay: dict = None, ter_penalty: float = None, pref_val: float = None):
+        # re-optimise with new cost parameters, only the objective is rebuilt and the previous solution is the warm
+        # start; tow and nobay are per category as in costs.json, pref_val replaces every drawn preference value
+        # and pref_val=0 restores them
+        previous = self.__variables
+        self.__tow_data = dict(self.__tow_data, **(tow or {}))
+        self.__nobay_data = dict(self.__nobay_data, **(nobay or {}))
+        self.__ter_penalty = self.__ter_penalty if ter_penalty is None else ter_penalty
+        self.__pref_val = self.__pref_val if pref_val is None else pref_val or None
+        self.costs_turns()
+        self.costs_tows(self.__tow_data)
+        self.costs_nobay(self.__nobay_data)
+        self.__prob.setObjective(self.objective())
+
+        if self.__heuristic is not None:
+            self.__greedy = self.greedy()
+        self.warm_start(self.__greedy if self.__heuristic == "only" else previous)
+
+        start = time.perf_counter()
+        self.solve(solver=self.__solver)
+        self.__variables = self.parse_variables()
+        self.__solvetime = time.perf_counter() - start
+        return self.__variables
+
+    def return_cost_data(self):
+        return self.__tow_data, self.__nobay_data, self.__ter_penalty
+
+    def greedy(self):
+        # constructive assignment in ETA order, each turn takes the cheapest free compatible bay
+        table = {pair: set(bays) for pair, bays in adj_table(self.__adj, self.__bays).items()}
+        occupied = {bay: IntervalSet() for bay in self.__keys_bays}
+        where = {}
+        cat = self.__index_compat.cat
+        result = {'w': {}, 'x': {}, 'y': {}}
+
+        def conflicts(i, ter, k):
+            # turns that block i on bay k, either on the bay itself or through an adjacency rule on k-2/k+2
+            start, end = self.__index_time.window(i)
+            found = [j for j in occupied[ter, k].overlapping(start, end) if not flight_check(flights=[i, j])]
+            if (ter, k + 2) in occupied:
+                found += [j for j in occupied[ter, k + 2].overlapping(start, end) if not
+                          flight_check(flights=[i, j]) and (ter, k) in table.get((cat(i), cat(j)), ())]
+            if (ter, k - 2) in occupied:
+                found += [j for j in occupied[ter, k - 2].overlapping(start, end) if not
+                          flight_check(flights=[i, j]) and (ter, k - 2) in table.get((cat(j), cat(i)), ())]
+            return found
+
+        def cheapest(i):
+            for ter, k in sorted(self.var_bays(flight=i), key=lambda b: self.__costs_turns[i][b[0]][b[1]]):
+                if not conflicts(i, ter, k):
+                    return (ter, k), self.__costs_turns[i][ter][k]
+            return None, None
+
+        def place(i, bay):
+            occupied[bay].add(i, *self.__index_time.window(i))
+            where[i] = bay
+
+        def unplace(i):
+            occupied[where[i]].remove(i)
+            return where.pop(i)
+
+        # forced tows have neither a whole-turn nor a no-bay option in the model (TowConst), their splits go first
+        forced = {l for l in self.__lturns["FULL"] if self.__lturns["FULL"][l].get("tow")}
+        for i in sorted(self.__map_fturns, key=lambda f: (f not in forced, self.__map_fturns[f]["ETA"])):
+            # candidate options as (cost, [(turn, bay)], towed)
+            options = [(self.__costs_nobay[i], [], False)]
+            if i in self.__lturns["FULL"]:
+                if i in forced:
+                    options = []
+                else:
+                    bay, cost = cheapest(i)
+                    if bay is not None:
+                        options.append((cost, [(i, bay)], False))
+                splits = [(i + s,) + cheapest(i + s) for s in ["A", "P", "D"]]
+                if all(bay is not None for _, bay, _ in splits):
+                    options.append((self.__costs_tows[i] + sum(cost for _, _, cost in splits),
+                                    [(s, bay) for s, bay, _ in splits], True))
+            else:
+                bay, cost = cheapest(i)
+                if bay is not None:
+                    options.append((cost, [(i, bay)], False))
+
+            if not options:
+                result['y'][int(i)] = 1.0
+                continue
+            cost, placed, towed = min(options, key=lambda o: o[0])
+            if towed:
+                result['w'][int(i)] = 1.0
+            elif not placed:
+                result['y'][int(i)] = 1.0
+            for f, bay in placed:
+                place(f, bay)
+
+        # repair: an unassigned turn may take a bay if its single blocking turn can move to another free bay
+        for i in sorted(result['y'], key=lambda f: -self.__costs_nobay[str(f)]):
+            i = str(i)
+            if i in forced:
+                # a whole-turn bay would still leave TowConst unmet
+                continue
+            for ter, k in sorted(self.var_bays(flight=i), key=lambda b: self.__costs_turns[i][b[0]][b[1]]):
+                blockers = conflicts(i, ter, k)
+                if len(blockers) != 1 or blockers[0] not in self.__map_fturns:
+                    continue
+                j = blockers[0]
+                old = unplace(j)
+                place(i, (ter, k))
+                bay, cost = cheapest(j)
+                if bay is not None and self.__costs_turns[i][ter][k] + cost - self.__costs_turns[j][old[0]][old[1]] \
+                        < self.__costs_nobay[i]:
+                    place(j, bay)
+                    del result['y'][int(i)]
+                    break
+                unplace(i)
+                place(j, old)
+
+        for f, (ter, k) in where.items():
+            result['x'][f] = {'type': ter, 'id': str(k)}
+        return result
+
+    def warm_start(self, result: dict):
+        if self.__symmetries:
+            result = self.canonical(result)
+        for (i, ter, k), var in self.__var_turn.items():
+            var.setInitialValue(1 if result['x'].get(i) == {'type': ter, 'id': str(k)} else 0)
+        for l, var in self.__var_tow.items():
+            var.setInitialValue(1 if int(l) in result['w'] else 0)
+        for i, var in self.__var_nobay.items():
+            var.setInitialValue(1 if int(i) in result['y'] else 0)
+        if self.__backend == "pulp":
+            if self.__solver is None:
+                self.__solver = PULP_CBC_CMD(warmStart=True)
+            elif hasattr(self.__solver, "optionsDict"):
+                self.__solver.optionsDict["warmStart"] = True
+
+    def return_greedy(self):
+        return self.__greedy
+
+    @phase(rows=True)
+    def fix_const(self, fixed: dict = None):
+        fixed = self.__fixed if fixed is None else \
+            {var: {**self.__fixed.get(var, {}), **fixed.get(var, {})} for var in ['w', 'x', 'y']}
+        for i, bay in fixed.get('x', {}).items():
+            if i in self.__map_turns:
+                self.__prob += lpSum(self.__var_turn[i, bay['type'], int(bay['id'])]) == 1, "FixConstFlight%s" % i
+        for l in fixed.get('w', {}):
+            if str(l) in self.__var_tow:
+                self.__prob += lpSum(self.__var_tow[str(l)]) == 1, "FixConstTowFlight%s" % l
+        for i in fixed.get('y', {}):
+            if str(i) in self.__var_nobay:
+                self.__prob += lpSum(self.__var_nobay[str(i)]) == 1, "FixConstNoBayFlight%s" % i
+
+    def flight_costs(self, result: dict):
+        # cost per base flight of an assignment in solve() result format, offsets excluded
+        costs = defaultdict(float)
+        for i, x in result['x'].items():
+            costs[base_flight(i)] += self.__costs_turns[i][x['type']][int(x['id'])]
+        for l in result['w']:
+            costs[str(l)] += self.__costs_tows[str(l)]
+        for i in result['y']:
+            costs[str(i)] += self.__costs_nobay[str(i)]
+        return dict(costs)
+
+    def solution_cost(self, result: dict):
+        # objective value of an assignment in solve() result format
+        return sum(self.flight_costs(result).values())
+
+    @phase()
     def writeLP(self):
         # The problem data is written to an .lp file
         self.__prob.writeLP("BayAssignmentProblem.lp")
 
+    @phase()
     def solve(self, solver):
-        # The problem is solved using PuLP's choice of Solver
-        self.__prob.solve(solver)
+        if self.__heuristic == "only":
+            # the greedy values are already set on the variables by warm_start
+            pass
+        elif self.__backend == "highs":
+            self.solve_highs()
+        else:
+            # The problem is solved using PuLP's choice of Solver
+            self.__prob.solve(solver)
+
+        # fall back to the greedy assignment when the solver stopped without an incumbent
+        if self.__greedy is not None and any(v.varValue is None for v in self.__prob.variables()):
+            self.warm_start(self.__greedy)
 
         # The status of the solution is printed to the screen
-        print("Status:", LpStatus[self.__prob.status])
+        print("Status:", status_name(self.__prob.status, self.__prob.sol_status))
+        # The optimised objective function value is printed to the screen
+        print("Objective Function Value = ", value(self.__prob.objective))
 
+    @phase()
+    def parse_variables(self):
         # Each of the variables is printed with it's resolved optimum value
         result = {'w':{}, 'x':{}, 'y':{}}
         vars = self.__prob.variables()
@@ -282,16 +713,27 @@ class LPSolver(object):
                         'type': vals[2],
                         'id': vals[3]
                     }
-
-        # The optimised objective function value is printed to the screen
-        print("Objective Function Value = ", value(self.__prob.objective))
         return result
 
+    def solve_highs(self):
+        variables, c, A, lb, ub, bounds, integrality = lp_matrices(self.__prob)
+        res = solve_highs(c, A, lb, ub, bounds=bounds, integrality=integrality, time_limit=self.__time_limit,
+                          mip_gap=self.__mip_gap)
+        # map the HiGHS status onto PuLP's so the rest of the pipeline reads the same problem object
+        if res.x is not None:
+            for v, val in zip(variables, res.x):
+                v.varValue = float(val)
+        self.__prob.status, self.__prob.sol_status = highs_status(res)
+
     def return_data(self, *vars):
-        attr = return_data(self, 'map')
+        attr = return_data(self, 'map', 'index')
         attr['schedule'] = attr['schedule'].return_data()
         attr['prob'] = return_data(attr['prob'], custom=False)
+        # PuLP 3 keeps the rows in _constraints, constraints is only a deprecated view of the same dict
+        if '_constraints' in attr['prob']:
+            attr['prob'].pop('constraints', None)
         attr['solver'] = return_data(attr['solver'])
+        attr['instrument'] = None if attr['instrument'] is None else attr['instrument'].report()
         if len(vars) == 0:
             return attr
         else:
@@ -0,0 +1,128 @@
+"""
+Scaling benchmark of the Bay Assignment pipeline
+Every (seed, nflights) instance runs in a fresh worker process, one at a time, and reads the per-phase report of
+src/instrument.py: schedule generation, cost set-up, every constraint family, the LP file, the solve and the export
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from src.bay_assignment import LPSolver, make_data_serializable
+from src.flight_schedule import Scheduler
+from src.instrument import Instrument
+
+try:
+    import resource
+except ImportError:
+    # peak memory is only reported where the resource module exists (not on Windows)
+    resource = None
+
+# the run log main.py writes
+EXPORT = ['ac', 'bays', 'schedule', 'turns', 'lturns', 'date_format', 'variables', 'problem']
+
+
+def bench_run(seed: int, nflights: int, options: dict, data_dir: str):
+    # worker: one instance, a fresh process so the peak resident memory belongs to this run only; the LP file is
+    # written into a scratch directory as in src/batch.py, so the caller's directory is left alone
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="bench_")
+    os.chdir(scratch)
+    try:
+        instrument = Instrument()
+        random.seed(seed)
+        with instrument.timer("schedule"):
+            schedule = Scheduler(nflights, ac_file=os.path.join(data_dir, "ac.json"),
+                                 terminal_file=os.path.join(data_dir, "terminals.json"),
+                                 feature_file=os.path.join(data_dir, "features.json"),
+                                 schedule_file=os.path.join(data_dir, "scheduling.json"), instrument=instrument)
+        with instrument.timer("lpsolver"):
+            lp = LPSolver(nflights=nflights, schedule=schedule, adj_file=os.path.join(data_dir, "adj.json"),
+                          instrument=instrument, **options)
+        with instrument.timer("export"):
+            json.dumps(make_data_serializable(lp.return_data(*EXPORT)))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    prob = lp.return_problem()
+    report = instrument.report()
+    return {"seed": seed, "nflights": nflights, "variables": len(prob.variables()),
+            "constraints": len(prob.constraints), "rows": report["rows"],
+            "times": {name: p["time"] for name, p in report["phases"].items()},
+            "counters": report["counters"], "status": lp.return_status(), "objective": lp.return_objective(),
+            "peak_memory_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Benchmark(object):
+    def __init__(self, nflights: list = (25, 50, 100, 200, 300, 500), seeds: list = (2021, 299, 9999),
+                 data_dir: str = r"./programdata", **options):
+        # options are passed on to LPSolver, the default is CBC with a time limit so every Linux box can run it
+        self.__nflights = list(nflights)
+        self.__seeds = list(seeds)
+        self.__data_dir = os.path.abspath(data_dir)
+        self.__options = dict({"backend": "pulp", "time_limit": 60}, **options)
+        self.__meta = {"commit": git_commit(), "date": datetime.now().strftime("%Y/%m/%d %H:%M:%S"),
+                       "python": sys.version.split()[0], "platform": platform.platform(),
+                       "options": {k: str(v) for k, v in self.__options.items()}}
+
+        self.__runs = []
+        for n in self.__nflights:
+            for seed in self.__seeds:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    self.__runs.append(pool.submit(bench_run, seed, n, self.__options, self.__data_dir).result())
+
+    def return_runs(self):
+        return self.__runs
+
+    def return_summary(self):
+        # mean stage times and sizes per instance size
+        summary = []
+        for n in self.__nflights:
+            runs = [r for r in self.__runs if r["nflights"] == n]
+            summary.append({"nflights": n,
+                            "variables": sum(r["variables"] for r in runs) / len(runs),
+                            "constraints": sum(r["constraints"] for r in runs) / len(runs),
+                            "times": {s: sum(r["times"].get(s, 0.) for r in runs) / len(runs)
+                                      for s in runs[0]["times"]}})
+        return summary
+
+    def write(self, path: str = None):
+        if path is None:
+            stamp = self.__meta["commit"] or datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+            path = fr'./outputdata/benchmark_{stamp}.json'
+        with open(path, 'w+') as file:
+            file.write(json.dumps({"meta": self.__meta, "summary": self.return_summary(), "runs": self.__runs}))
+        return path
+
+
+def compare(old_file: str, new_file: str):
+    # stage time ratio new/old per instance size, > 1 is a slowdown
+    with open(old_file, 'r') as file:
+        old = {s["nflights"]: s for s in json.load(file)["summary"]}
+    with open(new_file, 'r') as file:
+        new = {s["nflights"]: s for s in json.load(file)["summary"]}
+    return {n: {stage: new[n]["times"][stage] / old[n]["times"][stage]
+                for stage in new[n]["times"] if old[n]["times"].get(stage)}
+            for n in new if n in old}
+
+
+if __name__ == "__main__":
+    benchmark = Benchmark()
+    print(benchmark.write())
+    for row in benchmark.return_summary():
+        print(row["nflights"], row["variables"], row["constraints"], row["times"])
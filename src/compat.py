@@ -0,0 +1,91 @@
+"""
+Aircraft lookup and turn/bay compatibility index
+"""
+from collections import defaultdict
+
+import numpy as np
+
+
+def ac_index(ac: dict):
+    # AC name -> aircraft record
+    return {ac[x]["AC"]: ac[x] for x in ac}
+
+
+def adj_table(adj: dict, bays: dict):
+    # (cat at bay k, cat at bay k+2) -> bays k whose neighbour pair is restricted by adj.json
+    table = defaultdict(list)
+    for ter in bays:
+        for k in bays[ter]:
+            if k + 2 in bays[ter]:
+                rules = adj.get(ter, {}).get(bays[ter][k]["size"], {}).get(bays[ter][k + 2]["size"], {})
+                for cat1 in bays[ter][k]["cat"]:
+                    for cat2 in bays[ter][k + 2]["cat"]:
+                        if cat2 in rules.get(cat1, []):
+                            table[(cat1, cat2)].append((ter, k))
+    return table
+
+
+class CompatIndex(object):
+    def __init__(self, ac: dict, bays: dict, turns: dict):
+        self.__ac = ac_index(ac)
+        self.__bays = [(ter, k) for ter in bays for k in bays[ter]]
+        self.__cols = {bay: n for n, bay in enumerate(self.__bays)}
+        self.__turns = list(turns)
+        self.__rows = {i: n for n, i in enumerate(self.__turns)}
+        self.__turn_ac = {i: self.__ac[turns[i]["AC"]] for i in self.__turns}
+
+        self.__cats = sorted(set(self.__ac[x]["cat"] for x in self.__ac))
+        codes = {c: n for n, c in enumerate(self.__cats)}
+
+        # category x bay and turn x bay boolean compatibility matrices
+        self.__cat_bays = np.array([[c in bays[ter][k]["cat"] for ter, k in self.__bays] for c in self.__cats],
+                                   dtype=bool).reshape(len(self.__cats), len(self.__bays))
+        self.__matrix = self.__cat_bays[np.array([codes[self.cat(i)] for i in self.__turns], dtype=int)] \
+            .reshape(len(self.__turns), len(self.__bays))
+
+        self.__bays_cat = {c: [self.__bays[n] for n in np.flatnonzero(self.__cat_bays[codes[c]])]
+                           for c in self.__cats}
+        self.__common = {}
+
+    def ac(self, name: str):
+        return self.__ac[name]
+
+    def turn_ac(self, turn: str):
+        return self.__turn_ac[turn]
+
+    def cat(self, turn: str):
+        return self.__turn_ac[turn]["cat"]
+
+    def cap(self, turn: str):
+        return self.__turn_ac[turn]["cap"]
+
+    def compatible(self, turn: str, ter: str, k: int):
+        return bool(self.__matrix[self.__rows[turn], self.__cols[(ter, k)]])
+
+    def bays(self, turn: str):
+        return self.__bays_cat[self.cat(turn)]
+
+    def common_bays(self, turn1: str, turn2: str):
+        pair = (self.cat(turn1), self.cat(turn2))
+        if pair not in self.__common:
+            self.__common[pair] = [b for b in self.__bays_cat[pair[0]] if b in self.__bays_cat[pair[1]]]
+        return self.__common[pair]
+
+    def turns(self, ter: str, k: int):
+        return [self.__turns[r] for r in np.flatnonzero(self.__matrix[:, self.__cols[(ter, k)]])]
+
+    def groups(self):
+        # bays with an identical compatibility column share the same candidate turns
+        groups = defaultdict(list)
+        for bay, n in self.__cols.items():
+            groups[self.__cat_bays[:, n].tobytes()].append(bay)
+        return [(self.turns(*bays[0]), bays) for bays in groups.values()]
+
+    def return_matrix(self):
+        return self.__matrix
+
+    def return_turns(self):
+        return self.__turns
+
+    def return_bays(self):
+        return self.__bays
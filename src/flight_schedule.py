@@ -2,6 +2,7 @@ import inspect
 import json
 
 from math import ceil
+import numpy as np
 from random import choices, gauss
 from collections import defaultdict
 from datetime import datetime, timedelta
@@ -10,6 +11,11 @@ from matplotlib.ticker import MaxNLocator
 
 import matplotlib.pyplot as plt
 
+from src.compat import ac_index
+from src.instrument import Instrument, phase
+from src.turns import Turn, SplitTurn
+from src.ingest import ScheduleSource
+
 
 def convert_dict_keys(data: dict, keytype: type = int):
     result = {}
@@ -54,9 +60,17 @@ def minmaxd(data:dict):
 class Scheduler(object):
     def __init__(self, nflights: int, date: datetime = datetime(2010, 6, 15), plotting: bool = False,
                  ac_file: str = r"./programdata/ac.json", terminal_file: str = r"./programdata/terminals.json",
-                 feature_file : str = r"./programdata/features.json", schedule_file: str = r"./programdata/scheduling.json"):
-        self.__date = date
-        self.__nflights = nflights
+                 feature_file : str = r"./programdata/features.json",
+                 schedule_file: str = r"./programdata/scheduling.json",
+                 instrument: Instrument = None, rng: np.random.Generator = None, source: ScheduleSource = None):
+        # opt-in phase timers and counters, see src/instrument.py
+        self.__instrument = instrument
+        # a seed or numpy Generator switches to the batched generator, None keeps the global random draws
+        self.__rng = None if rng is None else np.random.default_rng(rng)
+        # a loaded schedule (src/ingest.py) replaces the synthetic flights, nflights and date follow from it
+        self.__source = source
+        self.__date = date if source is None else source.return_origin()
+        self.__nflights = nflights if source is None else source.return_size()
 
         with open(schedule_file, 'r') as file:
             time_data = json.load(file)
@@ -68,11 +82,13 @@ class Scheduler(object):
         with open(terminal_file, 'r') as file:
             self.__terminals = json.load(file)
 
-        # Aircraft passenger capacity and ac group from:
-        # https://www.dvbbank.com/~/media/Files/D/dvbbank-corp/aviation/dvb-overview-of-commercial-aircraft-2018-2019.pdf
+        # Aircraft passenger capacity and ac group from the DVB overview of commercial aircraft 2018-2019:
+        # https://www.dvbbank.com/~/media/Files/D/dvbbank-corp/aviation/
+        # dvb-overview-of-commercial-aircraft-2018-2019.pdf
         with open(ac_file, 'r') as file:
             self.__ac = json.load(file)
             self.__ac = {int(key): value for key, value in self.__ac.items()}
+            self.__index_ac = ac_index(self.__ac)
 
         with open(feature_file, 'r') as file:
             temp = json.load(file)
@@ -97,6 +113,10 @@ class Scheduler(object):
         self.__turns, self.__lturns = self.pross_schedule()
 
         self.__costs = self.make_costs()
+        if instrument is not None:
+            instrument.count("flights", len(self.__schedule))
+            instrument.count("turns", len(self.__turns))
+            instrument.count("lturns", len(self.__lturns["FULL"]))
 
         self.plotter() if plotting else None
 
@@ -104,9 +124,9 @@ class Scheduler(object):
         return datetime(self.__date.year, self.__date.month, self.__date.day, hours, minutes)
 
     def ac_data(self, AC: str):
-        return self.__ac[
-            list(self.__ac.keys())[[self.__ac[x]["AC"] for x in self.__ac].index(AC)]]
+        return self.__index_ac[AC]
 
+    @phase()
     def make_costs(self):
         ac_cat = list(set(list(self.__ac[ac]["cat"] for ac in self.__ac)))
         tow_costs = dict.fromkeys(ac_cat, 0)
@@ -143,6 +163,7 @@ class Scheduler(object):
             assert(tow_costs[cat] < nobay_costs[cat])
         return tow_costs, nobay_costs, ter_penalty
 
+    @phase()
     def get_bays(self):
         for ter in list(self.__terminals.keys()):
             bays = sum([(list(self.__terminals[ter][tbay].values())[0]) for tbay in self.__terminals[ter]])
@@ -163,7 +184,12 @@ class Scheduler(object):
                     self.__bays[ter][k] = {"cat": cat_list(self.__terminals[ter]["B"]["cat"]), "size": "B",
                                            "dist": self.__terminals[ter]["B"]["dist"]}
 
+    @phase()
     def make_schedule(self):
+        if self.__source is not None:
+            return self.make_schedule_source()
+        if self.__rng is not None:
+            return self.make_schedule_batch()
         for n in range(1, self.__nflights + 1):
             vals = list(self.__prob.keys())
             weights = list(self.__prob[k]['weight'] for k in self.__prob.keys())
@@ -189,6 +215,94 @@ class Scheduler(object):
                             av_bays.append(k)
                     self.__schedule[str(n)].update({"pref": {"ter": ter, "bay": choices(av_bays)[0],
                                                              "val": choices([v for v in range(5, 11)])[0]}})
+            self.__schedule[str(n)] = Turn(**self.__schedule[str(n)])
+
+    def make_schedule_batch(self):
+        # the draws are vectorised, the Turn records of the one requested day are still built flight by flight
+        sample = {key: val[0] for key, val in self.sample(self.__rng, ndays=1).items()}
+        planes = list(self.__ac)
+        zones = list(self.__prob)
+        for n in range(self.__nflights):
+            plane = planes[sample["ac"][n]]
+            ter = self.__prob[zones[sample["zone"][n]]]['type']
+            self.__schedule[str(n + 1)] = Turn(
+                AC=self.__ac[plane]["AC"], ETA=self.__date + timedelta(minutes=int(sample["eta"][n])),
+                ETD=self.__date + timedelta(minutes=int(sample["etd"][n])), ter=ter,
+                tow=True if sample["tow"][n] else None,
+                pref={"ter": ter, "bay": int(sample["pref_bay"][n]), "val": int(sample["pref_val"][n])}
+                if sample["pref_bay"][n] else None)
+
+    def make_schedule_source(self):
+        # flights of the loaded columns numbered 1..n in file order, the horizon grows to cover all of them
+        columns = self.__source.return_columns()
+        terminals = self.__source.return_terminals()
+        origin = self.__date
+        for n in range(self.__nflights):
+            ter = terminals[columns["ter"][n]]
+            self.__schedule[str(n + 1)] = Turn(
+                AC=self.__ac[int(columns["ac"][n])]["AC"], ETA=origin + timedelta(minutes=int(columns["eta"][n])),
+                ETD=origin + timedelta(minutes=int(columns["etd"][n])), ter=ter,
+                tow=True if columns["tow"][n] else None,
+                pref={"ter": terminals[columns["pref_ter"][n]], "bay": int(columns["pref_bay"][n]),
+                      "val": int(columns["pref_val"][n])} if columns["pref_bay"][n] else None)
+        if self.__nflights:
+            self.__tstart = min(self.__tstart, origin + timedelta(minutes=int(columns["eta"].min())))
+            self.__tend = max(self.__tend, origin + timedelta(minutes=int(columns["etd"].max())))
+
+    def sample(self, rng: np.random.Generator, ndays: int = 1):
+        # draws ndays x nflights synthetic flights at once, same distributions as make_schedule/make_t
+        # returns integer arrays: zone and ac are indices into the feature and aircraft tables, eta/etd are
+        # minutes after midnight of the schedule date, pref_bay is 0 where no preference was drawn
+        size = (ndays, self.__nflights)
+        zones = list(self.__prob)
+        planes = list(self.__ac)
+        minutes = lambda dt: int((dt - self.__date).total_seconds() // 60)
+        tstart, tend, tmin = minutes(self.__tstart), minutes(self.__tend), int(self.__tmin.total_seconds() // 60)
+
+        p = np.array([self.__prob[z]['weight'] for z in zones], dtype=float)
+        zone = rng.choice(len(zones), size=size, p=p / p.sum())
+
+        ac = np.zeros(size, dtype=int)
+        ter_of = np.array([self.__prob[z]['type'] for z in zones])[zone]
+        for ter in self.__weights:
+            mask = ter_of == ter
+            p = np.array(list(self.__weights[ter]["AC"].values()), dtype=float)
+            ac[mask] = np.array([planes.index(a) for a in self.__weights[ter]["AC"]])[
+                rng.choice(len(p), size=int(mask.sum()), p=p / p.sum())]
+
+        # truncated normal offsets, rejected draws are redrawn together until every flight fits the day
+        mean_arr = np.array([minutes(self.__prob[z]["mean_arr"]) for z in zones])[zone]
+        mean_len = np.array([int(self.__prob[z]["mean_len"].total_seconds() // 60) for z in zones])[zone]
+        std_arr = np.array([self.__prob[z]["std_arr"] for z in zones], dtype=float)[zone]
+        std_len = np.array([self.__prob[z]["std_len"] for z in zones], dtype=float)[zone]
+        mean_arr, mean_len, std_arr, std_len = (a.ravel() for a in (mean_arr, mean_len, std_arr, std_len))
+        arr = np.zeros(mean_arr.size, dtype=int)
+        leng = np.zeros(mean_arr.size, dtype=int)
+        todo = np.arange(mean_arr.size)
+        while todo.size:
+            arr[todo] = np.rint(rng.normal(0, std_arr[todo]))
+            leng[todo] = np.rint(rng.normal(0, std_len[todo]))
+            todo = todo[(arr[todo] <= tstart - mean_arr[todo]) | (arr[todo] >= tend - mean_arr[todo] - tmin) |
+                        (leng[todo] <= tmin) | (leng[todo] >= tend - mean_arr[todo] - mean_len[todo] - arr[todo])]
+        eta = (mean_arr + arr).reshape(size)
+        etd = eta + (mean_len + leng).reshape(size)
+
+        cats = np.array([self.__ac[a]["cat"] for a in planes])[ac]
+        long = (etd - eta > int(self.__ttow.total_seconds() // 60)) & ~np.isin(cats, ["H", "A"])
+        tow = long & (rng.random(size) < np.array([self.__weights[self.__prob[z]['type']]["tow"] for z in zones])[zone])
+        pref = (cats != "A") & \
+            (rng.random(size) < np.array([self.__weights[self.__prob[z]['type']]["pref"] for z in zones])[zone])
+        pref_bay = np.zeros(size, dtype=int)
+        for ter in self.__weights:
+            for cat in set(cats[pref & (ter_of == ter)]):
+                mask = pref & (ter_of == ter) & (cats == cat)
+                av_bays = np.array([k for k in self.__bays[ter] if cat in self.__bays[ter][k]["cat"] and
+                                    self.__bays[ter][k]["size"] != "B"])
+                pref_bay[mask] = av_bays[rng.integers(len(av_bays), size=int(mask.sum()))]
+        pref_val = np.where(pref, rng.integers(5, 11, size=size), 0)
+
+        return {"zone": zone, "ac": ac, "eta": eta, "etd": etd, "tow": tow, "pref_bay": pref_bay,
+                "pref_val": pref_val}
 
     def make_t(self, mean_arr: datetime, std_arr: float, mean_len: timedelta, std_len: float):
         arr = round(gauss(0, std_arr * 60) / 60) * 60
@@ -202,23 +316,40 @@ class Scheduler(object):
         dep_dt = mean_arr + mean_len + timedelta(seconds=arr + leng)
         return arr_dt, dep_dt
 
+    def occupancy_profile(self, resolution: timedelta = timedelta(minutes=5)):
+        # aircraft on the ground (ETA <= t < ETD) per terminal and in total on a regular time grid
+        step = resolution.total_seconds()
+        grid = np.arange(int((self.__tend - self.__tstart).total_seconds() // step) + 2) * step
+        times = [self.__tstart + timedelta(seconds=t) for t in grid]
+        profile = {}
+        for ter in self.__weights:
+            flights = [f for f in self.__schedule.values() if f["ter"] == ter]
+            eta = np.sort([(f["ETA"] - self.__tstart).total_seconds() for f in flights])
+            etd = np.sort([(f["ETD"] - self.__tstart).total_seconds() for f in flights])
+            profile[ter] = np.searchsorted(eta, grid, side='right') - np.searchsorted(etd, grid, side='right')
+        return {"times": times, "terminals": profile, "total": sum(profile.values())}
+
+    def peak_demand(self):
+        # most aircraft of every category on the ground at the same moment, against the bays that can take them,
+        # a peak above the bays means flights will be towed to remote bays or left without one
+        events = defaultdict(list)
+        for f in self.__schedule.values():
+            cat = self.ac_data(f["AC"])["cat"]
+            events[cat] += [(f["ETA"], 1), (f["ETD"], -1)]
+        demand = {}
+        for cat, ev in events.items():
+            # departures sort before arrivals at the same moment, as in the occupancy profile
+            counts = np.cumsum([d for _, d in sorted(ev)])
+            demand[cat] = {"peak": int(counts.max()),
+                           "bays": sum(cat in self.__bays[ter][k]["cat"] for ter in self.__bays
+                                       for k in self.__bays[ter] if ter != "BUS"),
+                           "remote": sum(cat in self.__bays["BUS"][k]["cat"] for k in self.__bays.get("BUS", {}))}
+        return demand
+
     def plotter(self):
-        times = [self.__tstart + timedelta(seconds=5 * 60 * x) for x in
-                 range(int((self.__tend - self.__tstart).seconds / (5 * 60)) + 2)]
-        data = []
-
-        for ter in list(self.__weights.keys()):
-            lst = []
-            for time in times:
-                i = 0
-                for flight in self.__schedule:
-                    if self.__schedule[flight]["ETA"] <= time < self.__schedule[flight]["ETD"] and \
-                            self.__schedule[flight]["ter"] == ter:
-                        i += 1
-                lst.append(i)
-            data.append(lst)
-
-        data.append([sum(x) for x in zip(*data)])
+        profile = self.occupancy_profile()
+        times = profile["times"]
+        data = list(profile["terminals"].values()) + [profile["total"]]
 
         fig, ax = plt.subplots()
         plt.plot(times, data[0])
@@ -242,30 +373,51 @@ class Scheduler(object):
 
         plt.show()
 
+    @phase()
     def pross_schedule(self):
         turns = self.__schedule.copy()
         lturns = defaultdict(dict)
         for flight in self.__schedule:
             if self.__schedule[flight]["ETD"] - self.__schedule[flight]["ETA"] > self.__ttow and \
-                    self.__ac[list(self.__ac.keys())[[self.__ac[x]["AC"] for x in
-                                                      self.__ac].index(self.__schedule[flight]["AC"])]]["cat"] not in [
-                "H", "A"]:
-                lturns["FULL"][flight] = self.__schedule[flight].copy()
-                lturns["SPLIT"][flight + "A"] = self.__schedule[flight].copy()
-                lturns["SPLIT"][flight + "D"] = self.__schedule[flight].copy()
-                lturns["SPLIT"][flight + "P"] = self.__schedule[flight].copy()
-
-                lturns["SPLIT"][flight + "A"]["ETD"] = self.__schedule[flight]["ETA"] + timedelta(minutes=30)
-                lturns["SPLIT"][flight + "D"]["ETA"] = self.__schedule[flight]["ETD"] - timedelta(minutes=30)
-                lturns["SPLIT"][flight + "P"]["ETA"] = lturns["SPLIT"][flight + "A"]["ETD"]
-                lturns["SPLIT"][flight + "P"]["ETD"] = lturns["SPLIT"][flight + "D"]["ETA"]
-                if "pref" in lturns["SPLIT"][flight + "P"]:
-                    del lturns["SPLIT"][flight + "P"]['pref']
+                    self.ac_data(self.__schedule[flight]["AC"])["cat"] not in ["H", "A"]:
+                # the long turn shares the flight record, its splits are views on it
+                lturns["FULL"][flight] = self.__schedule[flight]
+                for part in ["A", "D", "P"]:
+                    lturns["SPLIT"][flight + part] = SplitTurn(self.__schedule[flight], part)
                 del turns[flight]
         return turns, lturns
 
+    def update_flight(self, flight: str, eta: datetime = None, etd: datetime = None):
+        # move a flight in time and keep its long-turn splits consistent, returns the turn ids that changed
+        eta = self.__schedule[flight]["ETA"] if eta is None else eta
+        etd = self.__schedule[flight]["ETD"] if etd is None else etd
+        long = etd - eta > self.__ttow and self.ac_data(self.__schedule[flight]["AC"])["cat"] not in ["H", "A"]
+        if long != (flight in self.__lturns["FULL"]):
+            raise ValueError("Flight %s changes between turn and long turn, the model has to be rebuilt" % flight)
+
+        # turns, long turns and splits all read this one record
+        self.__schedule[flight].update(ETA=eta, ETD=etd)
+        return [flight, flight + "A", flight + "D", flight + "P"] if long else [flight]
+
     def return_data(self):
-        return return_data(self)
+        data = return_data(self, 'index')
+        data['instrument'] = None if self.__instrument is None else self.__instrument.report()
+        data['rng'] = None if self.__rng is None else repr(self.__rng)
+        data['source'] = None if self.__source is None else self.__source.return_stats()
+        data['flight_ids'] = self.return_flight_ids()
+        return data
+
+    def return_flight_ids(self):
+        # flight number -> flight id of the loaded file, None for a generated schedule
+        if self.__source is None:
+            return None
+        return {str(n + 1): str(name) for n, name in enumerate(self.__source.return_names())}
+
+    def return_instrument(self):
+        return self.__instrument
+
+    def return_horizon(self):
+        return self.__tstart, self.__tend
 
     def return_turns(self):
         return self.__turns
@@ -286,5 +438,46 @@ class Scheduler(object):
         return self.__costs
 
 
+class ScheduleView(object):
+    # Scheduler restricted to a subset of flights and optionally of terminals, exposes the getters LPSolver reads
+    def __init__(self, schedule: Scheduler, flights: set, terminals: list = None):
+        self.__schedule = schedule
+        self.__turns = {i: v for i, v in schedule.return_turns().items() if i in flights}
+        self.__lturns = defaultdict(dict)
+        self.__lturns["FULL"] = {l: v for l, v in schedule.return_lturns()["FULL"].items() if l in flights}
+        self.__lturns["SPLIT"] = {s: v for s, v in schedule.return_lturns()["SPLIT"].items()
+                                  if s.rstrip("PAD") in flights}
+        self.__bays = {ter: v for ter, v in schedule.return_bays().items() if terminals is None or ter in terminals}
+
+    def return_data(self):
+        data = self.__schedule.return_data()
+        data.update(turns=self.__turns, lturns=self.__lturns, bays=self.__bays)
+        return data
+
+    def return_turns(self):
+        return self.__turns
+
+    def return_lturns(self):
+        return self.__lturns
+
+    def return_ac(self):
+        return self.__schedule.return_ac()
+
+    def return_bays(self):
+        return self.__bays
+
+    def return_termianls(self):
+        return self.__schedule.return_termianls()
+
+    def return_cost_data(self):
+        return self.__schedule.return_cost_data()
+
+    def return_horizon(self):
+        return self.__schedule.return_horizon()
+
+    def return_flight_ids(self):
+        return self.__schedule.return_flight_ids()
+
+
 if __name__ == "__main__":
     ac_schedule = Scheduler(nflights=80, plotting=True)
@@ -3,9 +3,28 @@ import matplotlib.pyplot as plt
 from collections import defaultdict
 import json, os
 import datetime as dt
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.patches import Patch
+
+from src.run_store import RunData
+
+
+def horizon(data):
+    form = data['date_format']
+    times = data.return_manifest() if isinstance(data, RunData) else data['schedule']
+    return dt.datetime.strptime(times['tstart'], form), dt.datetime.strptime(times['tend'], form)
+
+
+def flight_ac(data):
+    # flight number -> aircraft name, RunData reads it from two columns instead of the schedule records
+    if isinstance(data, RunData):
+        return data.flight_ac()
+    return {int(i): turn['AC'] for i, turn in data['schedule']['schedule'].items()}
 
 
 def extract_occupations_per_bay(data: dict):
+    if isinstance(data, RunData):
+        return data.occupations()
     form = data['date_format']
     gates = []
     for k1, v1 in data['bays'].items():
@@ -43,78 +62,98 @@ def extract_occupations_per_bay(data: dict):
     return distr
 
 
-def make_hbar(data: dict):
+def make_hbar(data: dict, show: bool = True, labels: bool = True, min_label: float = 0):
+    # one broken_barh collection per bay, flight numbers only on bars of at least min_label minutes
     bins = extract_occupations_per_bay(data)
 
-    t0 = dt.datetime.strptime(data['schedule']['tstart'], data['date_format'])
-    t1 = dt.datetime.strptime(data['schedule']['tend'], data['date_format'])
+    t0, t1 = horizon(data)
 
     x_step = dt.timedelta(hours=1, minutes=0)
     nxbins = round((t1 - t0) / x_step)
     ylabels = list(bins.keys())
     xlabels = [t0 + x_step * i for i in range(nxbins + 1)]
-    xrange = [t0 + dt.timedelta(minutes=1) * i for i in range((t1 - t0).seconds // 60)]
-
-    xdata = [
-        [(d[2] - d[1]).seconds for d in bin] for gate, bin in bins.items()
-    ]
-    xlefts = [
-        [(d[1] - t0).seconds for d in bin] for gate, bin in bins.items()
-    ]
-    mx = max(max([len(i) for i in xdata]), max([len(i) for i in xlefts]))
-    for l1, l2 in zip(xdata, xlefts):
-        while len(l1) != mx:
-            l1.append(0)
-        while len(l2) != mx:
-            l2.append(0)
-
-    fig, ax = plt.subplots()
 
     cat = set()
     for k1, v1 in data['bays'].items():
         for k2, v2 in v1.items():
             cat = cat.union(set(v2['cat']))
     cat = list(sorted(list(cat), reverse=True))
-    colour_gradient = plt.cm.get_cmap('tab10', len(cat))
-
-    def get_cat_id(c):
-        for i, item in enumerate(cat):
-            if c == item:
-                return i
-        return None
+    colours = plt.get_cmap('tab10', len(cat))(np.arange(len(cat)))
+    cat_id = {c: i for i, c in enumerate(cat)}
 
     plane_cat_map = {ac['AC']: ac['cat'] for ac in data['ac'].values()}
-    cat_count = {ac['cat']: 0 for ac in data['ac'].values()}
-
-    for i, (gate, bin) in enumerate(bins.items()):
-        for j, item in enumerate(bin):
-            w_vector = np.zeros((len(bins)), dtype=int)
-            w_vector[i] = (item[2] - item[1]).seconds
-            l_vector = np.zeros((len(bins)), dtype=int)
-            l_vector[i] = (item[1] - t0).seconds
-            plane = data['schedule']['schedule'][str(item[0])]['AC']
-            c = plane_cat_map[plane]
-            colour = colour_gradient(get_cat_id(c))
-            if cat_count[c] == 0:
-                ax.barh(ylabels, w_vector, left=l_vector, color=colour, linewidth=1, edgecolor=(0, 0, 0), label=c)
-            else:
-                ax.barh(ylabels, w_vector, left=l_vector, color=colour, linewidth=1, edgecolor=(0, 0, 0))
-
-            r, g, b, _ = colour
-            center = l_vector + w_vector / 2
-            text_color = 'white' if r * g * b < 0.5 else 'darkgrey'
-            ax.text(sum(center), ylabels.index(gate), str(item[0]), ha='center', va='center',
-                    color=text_color)
-            cat_count[c] += 1
+    planes = flight_ac(data)
 
-    ax.set_xticks([(xlabel - t0).seconds for xlabel in xlabels])
+    fig, ax = plt.subplots(figsize=(12, max(4, 0.3 * len(ylabels))))
+    used = set()
+    for y, gate in enumerate(ylabels):
+        if not bins[gate]:
+            continue
+        flights = np.array([item[0] for item in bins[gate]])
+        lefts = np.array([(item[1] - t0).total_seconds() for item in bins[gate]])
+        widths = np.array([(item[2] - item[1]).total_seconds() for item in bins[gate]])
+        ids = np.array([cat_id[plane_cat_map[planes[f]]] for f in flights])
+        used.update(ids)
+        ax.broken_barh(list(zip(lefts, widths)), (y - 0.4, 0.8), facecolors=colours[ids], edgecolor=(0, 0, 0),
+                       linewidth=1)
+        if labels:
+            for f, left, width, c in zip(flights, lefts, widths, ids):
+                if width >= min_label * 60:
+                    r, g, b, _ = colours[c]
+                    ax.text(left + width / 2, y, str(f), ha='center', va='center',
+                            color='white' if r * g * b < 0.5 else 'darkgrey')
+
+    ax.set_yticks(range(len(ylabels)))
+    ax.set_yticklabels(ylabels)
+    ax.set_ylim(-0.5, len(ylabels) - 0.5)
+    ax.set_xticks([(xlabel - t0).total_seconds() for xlabel in xlabels])
     ax.set_xticklabels([label.strftime('%H:%M') for label in xlabels], rotation=60)
     ax.xaxis.grid(True)
-    handles, labels = ax.get_legend_handles_labels()
-    labels, handles = zip(*sorted(zip(labels, handles), key=lambda t: t[0]))
-    ax.legend(handles, labels, ncol=len(cat), bbox_to_anchor=(0, 1),
-              loc='lower left')
-    plt.show()
+    handles = [Patch(facecolor=colours[i], edgecolor=(0, 0, 0), label=cat[i])
+               for i in sorted(used, key=lambda i: cat[i])]
+    ax.legend(handles=handles, ncol=len(cat), bbox_to_anchor=(0, 1), loc='lower left')
+    if show:
+        plt.show()
+    return fig
+
+
+def export_hbar(path: str, out_file: str, **kwargs):
+    # worker: renders one run log (run JSON or .npz/.manifest.json) to an image file without a display
+    plt.switch_backend("Agg")
+    if path.endswith(".json") and not path.endswith(".manifest.json"):
+        with open(path, 'r') as file:
+            data = json.load(file)
+    else:
+        data = RunData(path)
+    fig = make_hbar(data, show=False, **kwargs)
+    fig.savefig(out_file, bbox_inches='tight')
+    plt.close(fig)
+    return out_file
+
+
+# run log file endings, longest first
+RUN_EXTENSIONS = [".manifest.json", ".json", ".npz"]
+
+
+def export_runs(paths: list, out_dir: str, fmt: str = "png", processes: int = None, **kwargs):
+    # Gantt chart of every run into out_dir, rendered in parallel worker processes
+    os.makedirs(out_dir, exist_ok=True)
+    files = []
+    for p in paths:
+        stem = os.path.basename(p)
+        for ext in RUN_EXTENSIONS:
+            if stem.endswith(ext):
+                stem = stem[:-len(ext)]
+                break
+        # runs with the same stem (run.json next to run.npz, or from different directories) get _2, _3, ...
+        name, n = stem, 1
+        while os.path.join(out_dir, name + "." + fmt) in files:
+            n += 1
+            name = "%s_%s" % (stem, n)
+        files.append(os.path.join(out_dir, name + "." + fmt))
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(export_hbar, p, o, **kwargs) for p, o in zip(paths, files)]
+        return [future.result() for future in futures]
 
 
 def make_ac_bar(data: dict):
@@ -133,12 +172,12 @@ def make_ac_bar(data: dict):
                 pass
 
     for cat in ac_cat:
-        for turn in data["schedule"]["schedule"].values():
-            if cat == get_cat(turn["AC"]) and turn["AC"] not in ac_counts:
-                ac_counts[turn["AC"]]["cnt"] = 1
-                ac_counts[turn["AC"]]["cat"] = cat
-            elif cat == get_cat(turn["AC"]):
-                ac_counts[turn["AC"]]["cnt"] += 1
+        for plane in flight_ac(data).values():
+            if cat == get_cat(plane) and plane not in ac_counts:
+                ac_counts[plane]["cnt"] = 1
+                ac_counts[plane]["cat"] = cat
+            elif cat == get_cat(plane):
+                ac_counts[plane]["cnt"] += 1
 
     fig, ax = plt.subplots()
     ax.yaxis.set_major_locator(plt.MaxNLocator(integer=True))
@@ -166,8 +205,12 @@ def make_len_bar(data: dict):
     t_width = 30
     form = data['date_format']
 
-    for turn in data["schedule"]["schedule"].values():
-        lengths.append((dt.datetime.strptime(turn["ETD"], form) - dt.datetime.strptime(turn["ETA"], form)).seconds)
+    if isinstance(data, RunData):
+        flights = data.column("part") == ""
+        lengths = list((data.column("etd")[flights] - data.column("eta")[flights]) * 60)
+    else:
+        for turn in data["schedule"]["schedule"].values():
+            lengths.append((dt.datetime.strptime(turn["ETD"], form) - dt.datetime.strptime(turn["ETA"], form)).seconds)
     i = 0
     while max(lengths) > i * t_width * 60:
         i += 1
@@ -0,0 +1,156 @@
+"""
+Streaming ingest of real flight schedules
+A CSV or JSONL schedule is read chunk by chunk, every chunk is turned straight into typed columns (aircraft code,
+terminal code, arrival/departure as integer minutes from the origin day, tow and preference) and only those columns
+are kept, so memory grows with the rows kept and the raw rows of one chunk. Scheduler(source=...) turns the columns
+into flights and applies the usual long-turn split and cost set-up
+"""
+import csv
+import json
+import time
+from itertools import islice
+from datetime import datetime
+
+import numpy as np
+
+# column or key names in the file, flight, tow and the preference fields are optional
+FIELDS = {"flight": "flight", "ac": "ac", "eta": "eta", "etd": "etd", "ter": "ter", "tow": "tow",
+          "pref_ter": "pref_ter", "pref_bay": "pref_bay", "pref_val": "pref_val"}
+TRUE = {"1", "true", "yes", "y", "t"}
+
+
+def to_minutes(values: list, origin: np.datetime64, date_format: str = None):
+    # ISO 8601 timestamps are parsed by NumPy in one go, other formats row by row with date_format
+    if date_format is None:
+        stamps = np.array(values, dtype="datetime64[s]").astype("datetime64[m]")
+    else:
+        stamps = np.array([datetime.strptime(v, date_format) for v in values], dtype="datetime64[m]")
+    return (stamps - origin).astype(np.int32)
+
+
+def flags(values: list):
+    return np.array([v is True or str(v).strip().lower() in TRUE for v in values], dtype=bool)
+
+
+def integers(values: list):
+    return np.array([int(v) if v not in (None, "") else 0 for v in values], dtype=np.int16)
+
+
+class ScheduleSource(object):
+    def __init__(self, path: str, fmt: str = None, chunk: int = 50000, start: datetime = None, end: datetime = None,
+                 fields: dict = None, date_format: str = None, ac_file: str = r"./programdata/ac.json",
+                 terminal_file: str = r"./programdata/terminals.json"):
+        # fmt "csv" or "jsonl" (default from the file extension), start/end keep only flights on the ground in
+        # [start, end), e.g. one day of a multi-day export; times are minutes from midnight of start or the first row
+        self.__path = path
+        self.__fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        self.__chunk = chunk
+        self.__fields = dict(FIELDS, **(fields or {}))
+        self.__date_format = date_format
+
+        # aircraft name -> ac.json key, terminal name -> code
+        with open(ac_file, 'r') as file:
+            self.__ac_codes = {value["AC"]: int(key) for key, value in json.load(file).items()}
+        with open(terminal_file, 'r') as file:
+            self.__terminals = list(json.load(file))
+        self.__ter_codes = {ter: n for n, ter in enumerate(self.__terminals)}
+
+        self.__origin = None if start is None else np.datetime64(start.date(), "m")
+        parts = []
+        self.__stats = {"rows": 0, "kept": 0, "chunks": 0, "chunk_bytes": 0}
+        begin = time.perf_counter()
+        for raw in self.chunks():
+            columns = self.parse(raw)
+            self.__stats["rows"] += len(columns["eta"])
+            self.__stats["chunks"] += 1
+            self.__stats["chunk_bytes"] = max(self.__stats["chunk_bytes"], sum(c.nbytes for c in columns.values()))
+            keep = np.ones(len(columns["eta"]), dtype=bool)
+            if start is not None:
+                keep &= columns["etd"] > self.minutes(start)
+            if end is not None:
+                keep &= columns["eta"] < self.minutes(end)
+            parts.append({name: col[keep] for name, col in columns.items()})
+        self.__columns = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]} if parts else \
+            {name: np.zeros(0, dtype=int) for name in FIELDS}
+        self.__stats["kept"] = len(self.__columns["eta"])
+        self.__stats["bytes"] = sum(c.nbytes for c in self.__columns.values())
+        self.__stats["seconds"] = time.perf_counter() - begin
+
+    def minutes(self, t: datetime):
+        return int((np.datetime64(t, "m") - self.__origin).astype(int))
+
+    def chunks(self):
+        # raw field values of up to chunk rows at a time, as {field: [values]}
+        fields = self.__fields
+        with open(self.__path, 'r', newline='') as file:
+            if self.__fmt == "csv":
+                reader = csv.reader(file)
+                header = {name.strip(): n for n, name in enumerate(next(reader))}
+                while True:
+                    rows = list(islice(reader, self.__chunk))
+                    if not rows:
+                        return
+                    yield {key: [row[header[name]] for row in rows] if name in header else None
+                           for key, name in fields.items()}
+            else:
+                lines = (line for line in file if line.strip())
+                while True:
+                    rows = [json.loads(line) for line in islice(lines, self.__chunk)]
+                    if not rows:
+                        return
+                    yield {key: [row.get(name) for row in rows] if any(name in row for row in rows) else None
+                           for key, name in fields.items()}
+
+    def parse(self, raw: dict):
+        n = len(raw["eta"])
+        if self.__origin is None:
+            first = np.array(raw["eta"][:1], dtype="datetime64[s]") if self.__date_format is None else \
+                np.array([datetime.strptime(raw["eta"][0], self.__date_format)], dtype="datetime64[s]")
+            self.__origin = first[0].astype("datetime64[D]").astype("datetime64[m]")
+        eta = to_minutes(raw["eta"], self.__origin, self.__date_format)
+        etd = to_minutes(raw["etd"], self.__origin, self.__date_format)
+        if (etd <= eta).any():
+            raise ValueError("Row %s departs before it arrives" % (self.__stats["rows"] + int(np.argmax(etd <= eta))))
+
+        # names are looked up once per distinct value of the chunk
+        names, inverse = np.unique(np.array(raw["ac"], dtype=str), return_inverse=True)
+        unknown = [name for name in names if name not in self.__ac_codes]
+        if unknown:
+            raise ValueError("Aircraft %s not in ac.json" % ", ".join(unknown))
+        ac = np.array([self.__ac_codes[name] for name in names], dtype=np.int16)[inverse.reshape(n)]
+        names, inverse = np.unique(np.array(raw["ter"], dtype=str), return_inverse=True)
+        unknown = [name for name in names if name not in self.__ter_codes or name == "BUS"]
+        if unknown:
+            raise ValueError("Terminal %s not in terminals.json or the remote BUS bays" % ", ".join(unknown))
+        ter = np.array([self.__ter_codes[name] for name in names], dtype=np.int8)[inverse.reshape(n)]
+
+        pref_bay = np.zeros(n, dtype=np.int16) if raw["pref_bay"] is None else integers(raw["pref_bay"])
+        pref_ter = ter if raw["pref_ter"] is None else \
+            np.array([self.__ter_codes.get(t, -1) if t else -1 for t in raw["pref_ter"]], dtype=np.int8)
+        return {"flight": np.array(raw["flight"] if raw["flight"] is not None else
+                                   np.arange(self.__stats["rows"] + 1, self.__stats["rows"] + n + 1), dtype=str),
+                "ac": ac, "ter": ter, "eta": eta, "etd": etd,
+                "tow": np.zeros(n, dtype=bool) if raw["tow"] is None else flags(raw["tow"]),
+                "pref_ter": np.where(pref_ter >= 0, pref_ter, ter).astype(np.int8), "pref_bay": pref_bay,
+                # a preference without a value gets the middle of the generated 5..10 range
+                "pref_val": np.where(pref_bay > 0, 7, 0).astype(np.int16) if raw["pref_val"] is None else
+                np.where(pref_bay > 0, np.maximum(integers(raw["pref_val"]), 1), 0).astype(np.int16)}
+
+    def return_columns(self):
+        return self.__columns
+
+    def return_names(self):
+        # flight ids of the file, the Scheduler numbers flights 1..n in the same order
+        return self.__columns["flight"]
+
+    def return_origin(self):
+        return self.__origin.astype(datetime) if self.__origin is not None else datetime.min
+
+    def return_terminals(self):
+        return self.__terminals
+
+    def return_size(self):
+        return len(self.__columns["eta"])
+
+    def return_stats(self):
+        return self.__stats
@@ -0,0 +1,94 @@
+"""
+Opt-in phase timers, counters and profiling hooks for the Scheduler and LPSolver
+"""
+import time
+from functools import wraps
+from collections import defaultdict
+
+
+def phase(name: str = None, rows: bool = False):
+    # times a method when its object carries an Instrument, rows=True also counts the constraints it adds
+    def decorator(method):
+        label = method.__name__ if name is None else name
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            instrument = self.return_instrument()
+            if instrument is None:
+                return method(self, *args, **kwargs)
+            before = len(self.return_problem().constraints) if rows else 0
+            with instrument.timer(label):
+                result = method(self, *args, **kwargs)
+            if rows:
+                instrument.rows(label, len(self.return_problem().constraints) - before)
+            return result
+        return wrapper
+    return decorator
+
+
+def profiler_hook(profiler, phases: list = None):
+    # hook that runs a cProfile.Profile (or anything with enable/disable) inside the given phases, all if None
+    depth = [0]
+
+    def hook(event: str, name: str):
+        if phases is not None and name not in phases:
+            return
+        if event == "start":
+            if depth[0] == 0:
+                profiler.enable()
+            depth[0] += 1
+        else:
+            depth[0] -= 1
+            if depth[0] == 0:
+                profiler.disable()
+    return hook
+
+
+class Timer(object):
+    def __init__(self, instrument, name: str):
+        self.__instrument = instrument
+        self.__name = name
+
+    def __enter__(self):
+        self.__instrument.call_hooks("start", self.__name)
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.__instrument.add_time(self.__name, time.perf_counter() - self.__start)
+        self.__instrument.call_hooks("stop", self.__name)
+        return False
+
+
+class Instrument(object):
+    def __init__(self, hooks: list = None):
+        # hooks are called as hook(event, name) with event "start" or "stop" around every phase
+        self.__hooks = list(hooks or [])
+        self.__times = defaultdict(float)
+        self.__calls = defaultdict(int)
+        self.__rows = defaultdict(int)
+        self.__counters = defaultdict(int)
+
+    def add_hook(self, hook):
+        self.__hooks.append(hook)
+
+    def call_hooks(self, event: str, name: str):
+        for hook in self.__hooks:
+            hook(event, name)
+
+    def timer(self, name: str):
+        return Timer(self, name)
+
+    def add_time(self, name: str, seconds: float):
+        self.__times[name] += seconds
+        self.__calls[name] += 1
+
+    def rows(self, family: str, n: int):
+        self.__rows[family] += n
+
+    def count(self, name: str, n: int = 1):
+        self.__counters[name] += n
+
+    def report(self):
+        return {"phases": {name: {"calls": self.__calls[name], "time": self.__times[name]} for name in self.__times},
+                "rows": dict(self.__rows), "counters": dict(self.__counters)}
@@ -0,0 +1,87 @@
+"""
+Sweep-line index over closed (arrival, departure) windows
+"""
+from bisect import bisect_left, bisect_right
+
+
+class IntervalIndex(object):
+    def __init__(self, windows: dict):
+        # windows: {key: (start, end)}, intervals are closed so touching windows overlap
+        self.__windows = dict(windows)
+        self.__keys = sorted(self.__windows, key=lambda i: self.__windows[i][0])
+        self.__starts = [self.__windows[i][0] for i in self.__keys]
+        self.__span = max((e - s for s, e in self.__windows.values()), default=None)
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def window(self, key):
+        return self.__windows[key]
+
+    def pairs(self, keys: set = None):
+        # every overlapping pair exactly once, O(n log n + pairs)
+        order = [i for i in self.__keys if keys is None or i in keys]
+        starts = [self.__windows[i][0] for i in order]
+        for p, i1 in enumerate(order):
+            for i2 in order[p + 1:bisect_right(starts, self.__windows[i1][1], lo=p + 1)]:
+                yield i1, i2
+
+    def cliques(self, keys: set = None):
+        # maximal sets of windows that share a common moment, emitted in time order
+        events = []
+        for i in self.__keys:
+            if keys is None or i in keys:
+                start, end = self.__windows[i]
+                events.append((start, 0, i))
+                events.append((end, 1, i))
+        # starts sort before ends at the same moment, closed windows touching at a point overlap
+        events.sort(key=lambda e: (e[0], e[1]))
+
+        active = {}
+        grown = False
+        for _, kind, i in events:
+            if kind == 0:
+                active[i] = True
+                grown = True
+            else:
+                if grown:
+                    yield list(active)
+                    grown = False
+                del active[i]
+
+    def overlapping(self, start, end):
+        # all keys whose window shares at least one moment with [start, end]
+        if self.__span is None:
+            return []
+        lo = bisect_left(self.__starts, start - self.__span)
+        hi = bisect_right(self.__starts, end)
+        return [i for i in self.__keys[lo:hi] if self.__windows[i][1] >= start]
+
+
+class IntervalSet(object):
+    def __init__(self):
+        # growing set of closed windows kept sorted by start, same overlap query as IntervalIndex
+        self.__starts = []
+        self.__items = []
+        self.__span = None
+
+    def __len__(self):
+        return len(self.__items)
+
+    def add(self, key, start, end):
+        n = bisect_right(self.__starts, start)
+        self.__starts.insert(n, start)
+        self.__items.insert(n, (key, end))
+        self.__span = end - start if self.__span is None else max(self.__span, end - start)
+
+    def remove(self, key):
+        n = next(n for n, item in enumerate(self.__items) if item[0] == key)
+        del self.__starts[n]
+        del self.__items[n]
+
+    def overlapping(self, start, end):
+        if self.__span is None:
+            return []
+        lo = bisect_left(self.__starts, start - self.__span)
+        hi = bisect_right(self.__starts, end)
+        return [key for key, e in self.__items[lo:hi] if e >= start]
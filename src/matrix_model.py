@@ -0,0 +1,277 @@
+"""
+Matrix-form build of the Bay Assignment Problem
+Objective vector, sparse constraint matrix and row bounds are assembled directly as NumPy/SciPy arrays
+"""
+import time
+import json
+from collections import ChainMap
+from datetime import datetime, timedelta
+
+import numpy as np
+from scipy.optimize import milp, LinearConstraint, Bounds
+from scipy.sparse import coo_matrix
+from pulp import LpProblem, LpConstraintEQ, LpConstraintLE, LpInteger, LpStatus, LpSolution, \
+    LpSolutionIntegerFeasible
+
+from src.compat import CompatIndex, adj_table
+from src.flight_schedule import Scheduler
+from src.intervals import IntervalIndex
+
+# HiGHS' default relative MIP gap, a larger final gap came from a looser mip_gap and is not proven optimal
+OPTIMAL_GAP = 1e-4
+
+
+def overlap_pairs(start: np.ndarray, end: np.ndarray):
+    # vectorised sweep over closed windows, every overlapping (p1, p2) pair exactly once
+    order = np.argsort(start, kind="stable")
+    s, e = start[order], end[order]
+    counts = np.searchsorted(s, e, side="right") - np.arange(len(s)) - 1
+    p1 = np.repeat(np.arange(len(s)), counts)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    p2 = p1 + 1 + np.arange(counts.sum()) - offsets
+    return order[p1], order[p2]
+
+
+def lp_matrices(prob: LpProblem):
+    # objective, constraint matrix, row and column bounds of an already built PuLP problem, no LP file involved
+    variables = prob.variables()
+    col = {v.name: n for n, v in enumerate(variables)}
+    c = np.zeros(len(variables))
+    for v, coef in prob.objective.items():
+        c[col[v.name]] = coef
+
+    rows, cols, vals, lb, ub = [], [], [], [], []
+    for n, constraint in enumerate(prob.constraints.values()):
+        for v, coef in constraint.items():
+            rows.append(n)
+            cols.append(col[v.name])
+            vals.append(coef)
+        rhs = -constraint.constant
+        lb.append(rhs if constraint.sense != LpConstraintLE else -np.inf)
+        ub.append(rhs if constraint.sense in [LpConstraintLE, LpConstraintEQ] else np.inf)
+    A = coo_matrix((vals, (rows, cols)), shape=(len(prob.constraints), len(variables))).tocsr()
+
+    bounds = Bounds([-np.inf if v.lowBound is None else v.lowBound for v in variables],
+                    [np.inf if v.upBound is None else v.upBound for v in variables])
+    integrality = np.array([v.cat == LpInteger for v in variables], dtype=int)
+    return variables, c, A, np.array(lb, dtype=float), np.array(ub, dtype=float), bounds, integrality
+
+
+def solve_highs(c: np.ndarray, A, lb: np.ndarray, ub: np.ndarray, bounds: Bounds = None, integrality=None,
+                time_limit: float = None, mip_gap: float = None, msg: bool = False):
+    # in-process HiGHS through SciPy, the solution is returned as an array
+    options = {"disp": msg}
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    if mip_gap is not None:
+        options["mip_rel_gap"] = mip_gap
+    return milp(c, constraints=LinearConstraint(A, lb, ub),
+                integrality=np.ones(len(c)) if integrality is None else integrality,
+                bounds=Bounds(0, 1) if bounds is None else bounds, options=options)
+
+
+def highs_status(res):
+    # PuLP (status, sol_status) of a SciPy milp result, a time or gap stop with an incumbent is not optimal
+    if res.status == 0 and (getattr(res, "mip_gap", None) or 0) <= OPTIMAL_GAP:
+        return 1, 1
+    if res.x is not None:
+        return 0, LpSolutionIntegerFeasible
+    return {2: -1, 3: -2}.get(res.status, 0), 0
+
+
+def status_name(status: int, sol_status: int = None):
+    # LpStatus name, "Solution Found" for a feasible solution that was not proven optimal (CBC or HiGHS stop)
+    if sol_status == LpSolutionIntegerFeasible:
+        return LpSolution[sol_status]
+    return LpStatus[status]
+
+class MatrixModel(object):
+    def __init__(self, nflights: int = None, date: datetime = datetime(2010, 6, 15), tbuf: timedelta = None,
+                 adj_file: str = r"./programdata/adj.json", schedule: Scheduler = None, time_cliques: bool = False):
+        self.__schedule = Scheduler(nflights, date=date) if schedule is None else schedule
+        self.__tbuf = timedelta(minutes=15) if tbuf is None else tbuf
+        self.__time_cliques = time_cliques
+
+        with open(adj_file, 'r') as file:
+            self.__adj = json.load(file)
+
+        self.__rows = []
+        self.__lb = []
+        self.__ub = []
+        self.__nrows = 0
+        self.__variables = None
+        self.__objective = None
+        self.__solvetime = None
+
+        self.build()
+
+    def build(self):
+        ac = self.__schedule.return_ac()
+        bays = self.__schedule.return_bays()
+        tow_data, nobay_data, ter_penalty = self.__schedule.return_cost_data()
+        turns = self.__schedule.return_turns()
+        lturns = self.__schedule.return_lturns()
+        map_turns = ChainMap(turns, lturns["FULL"], lturns["SPLIT"])
+
+        self.__turns = list(map_turns)
+        self.__bays = [(ter, k) for ter in bays for k in bays[ter]]
+        self.__full = list(lturns["FULL"])
+        self.__fturns = list(ChainMap(turns, lturns["FULL"]))
+        index = CompatIndex(ac, bays, map_turns)
+        pos = {i: n for n, i in enumerate(self.__turns)}
+        ntur, nbay = len(self.__turns), len(self.__bays)
+
+        # turn and bay attributes as arrays
+        kind = np.array([i[-1] if i in lturns["SPLIT"] else "" for i in self.__turns], dtype=object)
+        base = np.unique([i[:-1] if kind[n] else i for n, i in enumerate(self.__turns)], return_inverse=True)[1] \
+            .reshape(ntur)
+        cats = sorted(set(ac[x]["cat"] for x in ac))
+        cat = np.array([cats.index(index.cat(i)) for i in self.__turns], dtype=int).reshape(ntur)
+        cap = np.array([index.cap(i) for i in self.__turns], dtype=float).reshape(ntur)
+        t0 = min((map_turns[i]["ETA"] for i in self.__turns), default=datetime.min)
+        start = np.array([(map_turns[i]["ETA"] + self.__tbuf - t0).total_seconds() for i in self.__turns])
+        end = np.array([(map_turns[i]["ETD"] + self.__tbuf - t0).total_seconds() for i in self.__turns])
+        dist = np.array([bays[ter][k]["dist"] for ter, k in self.__bays], dtype=float)
+        remote = np.array([ter == "BUS" for ter, k in self.__bays], dtype=bool)
+        home = np.array([[map_turns[i]["ter"] == ter for ter, k in self.__bays] for i in self.__turns], dtype=bool) \
+            .reshape(ntur, nbay)
+
+        # feasible x-variables, parked splits on remote bays and arrival/departure splits on terminal bays
+        feasible = index.return_matrix().copy()
+        feasible[kind == "P"] &= remote
+        feasible[(kind == "A") | (kind == "D")] &= ~remote
+        xt, xb = np.nonzero(feasible)
+        nx, nw, ny = len(xt), len(self.__full), len(self.__fturns)
+        xid = np.full((ntur, nbay), -1, dtype=int)
+        xid[xt, xb] = np.arange(nx)
+        self.__xkeys = list(zip(xt, xb))
+
+        # objective vector
+        a = np.where((kind == "A") | (kind == "D"), 2., 1.)
+        cost = cap[xt] * dist[xb] / a[xt] * np.where(home[xt, xb] | remote[xb], 1., ter_penalty)
+        cost[kind[xt] == "P"] = 1.
+        for i in self.__turns:
+            if "pref" in map_turns[i]:
+                bay = (map_turns[i]["pref"]["ter"], map_turns[i]["pref"]["bay"])
+                if bay in self.__bays and xid[pos[i], self.__bays.index(bay)] >= 0:
+                    cost[xid[pos[i], self.__bays.index(bay)]] /= map_turns[i]["pref"]["val"]
+        self.__c = np.concatenate([cost,
+                                   [tow_data[index.cat(l)] for l in self.__full],
+                                   [nobay_data[index.cat(i)] for i in self.__fturns]]).astype(float)
+        self.__names = ["x_%s_%s_%s" % ((self.__turns[t],) + self.__bays[b]) for t, b in self.__xkeys] + \
+                       ["w_%s" % l for l in self.__full] + ["y_%s" % i for i in self.__fturns]
+
+        wcol = {l: nx + n for n, l in enumerate(self.__full)}
+        ycol = {i: nx + nw + n for n, i in enumerate(self.__fturns)}
+
+        # assignment of turns and full long turns: x + (w) + y == 1
+        frow = np.full(ntur, -1, dtype=int)
+        frow[[pos[i] for i in self.__fturns]] = np.arange(ny)
+        mask = frow[xt] >= 0
+        self.add_rows(np.concatenate([frow[xt[mask]], np.arange(ny), [frow[pos[l]] for l in self.__full]]),
+                      np.concatenate([np.flatnonzero(mask), [ycol[i] for i in self.__fturns],
+                                      [wcol[l] for l in self.__full]]),
+                      np.ones(mask.sum() + ny + nw), ny, 1, 1)
+
+        # splits follow the tow decision: w - x == 0
+        srow = np.full(ntur, -1, dtype=int)
+        splits = [(l, l + s) for l in self.__full for s in ["P", "A", "D"]]
+        srow[[pos[s] for l, s in splits]] = np.arange(len(splits))
+        mask = srow[xt] >= 0
+        self.add_rows(np.concatenate([srow[xt[mask]], np.arange(len(splits))]),
+                      np.concatenate([np.flatnonzero(mask), [wcol[l] for l, s in splits]]),
+                      np.concatenate([-np.ones(mask.sum()), np.ones(len(splits))]), len(splits), 0, 0)
+
+        # forced tows: w == 1
+        tows = [wcol[l] for l in self.__full if lturns["FULL"][l].get("tow")]
+        self.add_rows(np.arange(len(tows)), np.array(tows, dtype=int), np.ones(len(tows)), len(tows), 1, 1)
+
+        p1, p2 = overlap_pairs(start, end)
+        other = base[p1] != base[p2]
+        p1, p2 = p1[other], p2[other]
+
+        # time conflicts on a bay
+        if self.__time_cliques:
+            windows = IntervalIndex({n: (start[n], end[n]) for n in range(ntur)})
+            groups = {}
+            for b in range(nbay):
+                groups.setdefault(feasible[:, b].tobytes(), []).append(b)
+            for group in groups.values():
+                members = set(np.flatnonzero(feasible[:, group[0]]))
+                for clique in windows.cliques(keys=members):
+                    if len(set(base[clique])) < 2:
+                        continue
+                    for b in group:
+                        self.add_rows(np.zeros(len(clique), dtype=int), xid[clique, b], np.ones(len(clique)), 1,
+                                      -np.inf, 1)
+        else:
+            both = (xid[p1] >= 0) & (xid[p2] >= 0)
+            pi, b = np.nonzero(both)
+            self.add_rows(np.repeat(np.arange(len(pi)), 2),
+                          np.column_stack([xid[p1[pi], b], xid[p2[pi], b]]).ravel(),
+                          np.ones(2 * len(pi)), len(pi), -np.inf, 1)
+
+        # adjacency restrictions on neighbouring bays k and k+2
+        rules = np.zeros((nbay, len(cats), len(cats)), dtype=bool)
+        for (cat1, cat2), restricted in adj_table(self.__adj, bays).items():
+            for ter, k in restricted:
+                rules[self.__bays.index((ter, k)), cats.index(cat1), cats.index(cat2)] = True
+        bb = np.array([n for n, (ter, k) in enumerate(self.__bays) if (ter, k + 2) in self.__bays], dtype=int)
+        nb = np.array([self.__bays.index((ter, k + 2)) for ter, k in (self.__bays[n] for n in bb)], dtype=int)
+        for f1, f2 in [(p1, p2), (p2, p1)]:
+            hit = rules[bb[:, None], cat[f1][None, :], cat[f2][None, :]] & \
+                  (xid[f1][:, bb].T >= 0) & (xid[f2][:, nb].T >= 0)
+            bi, pi = np.nonzero(hit)
+            self.add_rows(np.repeat(np.arange(len(pi)), 2),
+                          np.column_stack([xid[f1[pi], bb[bi]], xid[f2[pi], nb[bi]]]).ravel(),
+                          np.ones(2 * len(pi)), len(pi), -np.inf, 1)
+
+        rows, cols, vals = (np.concatenate(v) for v in zip(*self.__rows))
+        self.__A = coo_matrix((vals, (rows, cols)), shape=(self.__nrows, len(self.__c))).tocsr()
+        self.__lb = np.concatenate(self.__lb)
+        self.__ub = np.concatenate(self.__ub)
+
+    def add_rows(self, rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, n: int, lb: float, ub: float):
+        self.__rows.append((np.asarray(rows, dtype=int) + self.__nrows, np.asarray(cols, dtype=int),
+                            np.asarray(vals, dtype=float)))
+        self.__lb.append(np.full(n, lb, dtype=float))
+        self.__ub.append(np.full(n, ub, dtype=float))
+        self.__nrows += n
+
+    def solve(self, time_limit: float = None, mip_gap: float = None, msg: bool = False):
+        start = time.perf_counter()
+        res = solve_highs(self.__c, self.__A, self.__lb, self.__ub, time_limit=time_limit, mip_gap=mip_gap, msg=msg)
+        self.__solvetime = time.perf_counter() - start
+        print("Status:", res.message)
+
+        self.__variables = {'w': {}, 'x': {}, 'y': {}}
+        if res.x is None:
+            return self.__variables
+        self.__objective = res.fun
+        for name in (self.__names[n] for n in np.flatnonzero(np.abs(res.x - 1) < 0.0001)):
+            vals = name.split('_')
+            if vals[0] != 'x':
+                self.__variables[vals[0]][int(vals[1])] = 1.0
+            else:
+                self.__variables[vals[0]][vals[1]] = {'type': vals[2], 'id': vals[3]}
+        print("Objective Function Value = ", self.__objective)
+        return self.__variables
+
+    def write(self, path: str = "BayAssignmentProblem.npz"):
+        np.savez_compressed(path, c=self.__c, data=self.__A.data, indices=self.__A.indices, indptr=self.__A.indptr,
+                            shape=np.array(self.__A.shape), lb=self.__lb, ub=self.__ub, names=np.array(self.__names))
+
+    def return_matrices(self):
+        return self.__c, self.__A, self.__lb, self.__ub
+
+    def return_names(self):
+        return self.__names
+
+    def return_variables(self):
+        return self.__variables
+
+    def return_objective(self):
+        return self.__objective
+
+    def return_solvetime(self):
+        return self.__solvetime
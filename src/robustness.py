@@ -0,0 +1,201 @@
+"""
+Monte Carlo robustness of a solved assignment under delays
+Every scenario shifts the arrival of each flight and stretches its turn with normal draws per terminal, scaled from
+std_arr/std_len of features.json. All scenarios of a chunk are NumPy arrays (scenario x turn), the bays are walked once
+per chunk: direct conflicts, the waits they push down the bay (knock-on) and restricted k/k+2 overlaps are counted,
+chunks can run on a process pool
+"""
+import json
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.bay_assignment import base_flight
+from src.compat import ac_index, adj_table
+from src.turns import SPLIT
+
+# needed separation histograms cover -HIST..HIST minutes in 1 minute bins
+HIST = 720
+# a turn keeps at least this many minutes on the ground, long turns at least their two splits
+MIN_LEN = 10
+
+
+def delay_std(feature_file: str = r"./programdata/features.json", scale: float = 0.1):
+    # terminal -> (arrival, turn length) standard deviation in minutes, zone weighted and scaled from features.json
+    with open(feature_file, 'r') as file:
+        prob = json.load(file)["prob"]
+    std = {}
+    for ter in dict.fromkeys(zone["type"] for zone in prob.values()):
+        zones = [zone for zone in prob.values() if zone["type"] == ter]
+        weight = sum(zone["weight"] for zone in zones)
+        std[ter] = tuple(scale * sum(zone["weight"] * zone[key] for zone in zones) / weight
+                         for key in ["std_arr", "std_len"])
+    return std
+
+
+def make_plan(schedule, variables: dict, std: dict, adj: dict, margin: float):
+    # the assignment as flat arrays: flights (planned times in minutes, delay std), turns on bays and bay sequences
+    tstart, _ = schedule.return_horizon()
+    turns, lturns, bays = schedule.return_turns(), schedule.return_lturns(), schedule.return_bays()
+    fturns = dict(turns, **lturns["FULL"])
+    index = ac_index(schedule.return_ac())
+    flights = sorted({base_flight(str(i)) for i in variables['x']}, key=int)
+    fpos = {f: n for n, f in enumerate(flights)}
+    ids = sorted((str(i) for i in variables['x']), key=lambda i: (int(base_flight(i)), i))
+    keys = [(ter, k) for ter in bays for k in bays[ter]]
+    bpos = {bay: n for n, bay in enumerate(keys)}
+    bay = np.array([bpos[variables['x'][i]['type'], int(variables['x'][i]['id'])] for i in ids], dtype=int)
+
+    plan = {
+        "eta": np.array([(fturns[f]["ETA"] - tstart) / timedelta(minutes=1) for f in flights], dtype=float),
+        "etd": np.array([(fturns[f]["ETD"] - tstart) / timedelta(minutes=1) for f in flights], dtype=float),
+        "std_arr": np.array([std[fturns[f]["ter"]][0] for f in flights], dtype=float),
+        "std_len": np.array([std[fturns[f]["ter"]][1] for f in flights], dtype=float),
+        "flight": np.array([fpos[base_flight(i)] for i in ids], dtype=int),
+        # 0 whole turn, 1 arrival, 2 parked, 3 departure split
+        "part": np.array([["", "A", "P", "D"].index(i[-1] if i in lturns["SPLIT"] else "") for i in ids],
+                         dtype=int),
+        "bay": bay, "nbays": len(keys), "split": SPLIT / timedelta(minutes=1),
+    }
+    cats = sorted({index[x["AC"]]["cat"] for x in fturns.values()})
+    plan["cats"] = cats
+    plan["cat"] = np.array([cats.index(index[fturns[base_flight(i)]["AC"]]["cat"]) for i in ids], dtype=int)
+
+    # turns of every bay in planned start order, the start of a split follows from its part
+    start = plan["eta"][plan["flight"]] + np.where(plan["part"] == 2, plan["split"], 0.)
+    start = np.where(plan["part"] == 3, plan["etd"][plan["flight"]] - plan["split"], start)
+    plan["sequences"] = [seq[np.argsort(start[seq], kind="stable")] for seq in
+                         (np.flatnonzero(bay == b) for b in range(len(keys))) if seq.size]
+
+    # restricted neighbour pairs (turn on k, turn on k + 2) whose planned windows are closer than margin
+    table = adj_table(adj, bays)
+    end = start + np.where(plan["part"] == 0, (plan["etd"] - plan["eta"])[plan["flight"]], 0.)
+    end = np.where(plan["part"] == 1, start + plan["split"], end)
+    end = np.where(plan["part"] == 2, plan["etd"][plan["flight"]] - plan["split"], end)
+    end = np.where(plan["part"] == 3, plan["etd"][plan["flight"]], end)
+    pairs = []
+    for t1 in range(len(ids)):
+        ter, k = keys[bay[t1]]
+        for t2 in np.flatnonzero(bay == bpos.get((ter, k + 2), -1)):
+            if (ter, k) in table.get((cats[plan["cat"][t1]], cats[plan["cat"][t2]]), ()) and \
+                    plan["flight"][t1] != plan["flight"][t2] and \
+                    start[t1] - margin < end[t2] and start[t2] - margin < end[t1]:
+                pairs.append((t1, t2))
+    plan["adj"] = np.array(pairs, dtype=int).reshape(len(pairs), 2)
+    plan["turns"], plan["bays"] = ids, keys
+    return plan
+
+
+def windows(plan: dict, eta: np.ndarray, etd: np.ndarray):
+    # scenario x turn start and end from the scenario x flight times, splits keep their planned length
+    f, part, split = plan["flight"], plan["part"], plan["split"]
+    start, end = eta[:, f], etd[:, f]
+    start = np.where(part == 2, start + split, np.where(part == 3, end - split, start))
+    end = np.where(part == 1, start + split, np.where(part == 2, np.maximum(end - split, start), end))
+    return start, end
+
+
+def run_chunk(plan: dict, seed, n: int, min_gap: float):
+    # statistics of n scenarios, summed so chunks of any size merge by addition
+    rng = np.random.default_rng(seed)
+    nflights, nbays = len(plan["eta"]), plan["nbays"]
+    delay = rng.normal(0., plan["std_arr"], size=(n, nflights))
+    # long turns keep room for their arrival and departure splits
+    floor = np.where(np.isin(np.arange(nflights), plan["flight"][plan["part"] > 0]), 2 * plan["split"], MIN_LEN)
+    length = np.maximum(plan["etd"] - plan["eta"] + rng.normal(0., plan["std_len"], size=(n, nflights)), floor)
+    start, end = windows(plan, plan["eta"] + delay, plan["eta"] + delay + length)
+    pstart, pend = windows(plan, plan["eta"][None, :], plan["etd"][None, :])
+
+    stats = {"scenarios": n, "conflicts": np.zeros(nbays), "scenarios_conflict": np.zeros(nbays),
+             "wait": np.zeros(nbays), "knock_on": np.zeros(nbays), "adjacency": np.zeros(nbays),
+             "any_conflict": 0, "need": np.zeros((len(plan["cats"]), 2 * HIST + 1))}
+    per_scenario = np.zeros(n, dtype=int)
+    for seq in plan["sequences"]:
+        b = plan["bay"][seq[0]]
+        reach = np.full(n, -np.inf)
+        free = np.full(n, -np.inf)
+        conflicts = np.zeros(n, dtype=int)
+        for p, t in enumerate(seq):
+            if p and plan["flight"][seq[p - 1]] != plan["flight"][t]:
+                prev = seq[p - 1]
+                # separation the plan would have needed after the previous turn, per category of that turn
+                need = np.clip(np.rint((end[:, prev] - pend[0, prev]) - (start[:, t] - pstart[0, t])) + HIST,
+                               0, 2 * HIST).astype(int)
+                stats["need"][plan["cat"][prev]] += np.bincount(need, minlength=2 * HIST + 1)
+                direct = start[:, t] < reach + min_gap
+                wait = np.maximum(free + min_gap - start[:, t], 0.)
+                conflicts += direct
+                stats["wait"][b] += wait.sum()
+                stats["knock_on"][b] += ((wait > 0) & ~direct).sum()
+            else:
+                wait = np.zeros(n)
+            # latest planned-or-delayed end so far (direct conflicts) and latest end after waiting (knock-on)
+            reach = np.maximum(reach, end[:, t])
+            free = np.maximum(free, end[:, t] + wait)
+        stats["conflicts"][b] += conflicts.sum()
+        stats["scenarios_conflict"][b] += (conflicts > 0).sum()
+        per_scenario += conflicts
+
+    if len(plan["adj"]):
+        t1, t2 = plan["adj"][:, 0], plan["adj"][:, 1]
+        overlap = (start[:, t1] < end[:, t2]) & (start[:, t2] < end[:, t1])
+        stats["adjacency"] += np.bincount(plan["bay"][t1], weights=overlap.sum(axis=0), minlength=nbays)
+        per_scenario += overlap.sum(axis=1)
+    stats["any_conflict"] = int((per_scenario > 0).sum())
+    return stats
+
+
+class DelaySimulator(object):
+    def __init__(self, schedule, variables: dict, nscenarios: int = 10000, std: dict = None, scale: float = 0.1,
+                 min_gap: timedelta = timedelta(0), seed=None, chunk: int = 1000, processes: int = None,
+                 feature_file: str = r"./programdata/features.json", adj_file: str = r"./programdata/adj.json"):
+        # std: terminal -> (arrival, length) standard deviation in minutes, default delay_std(feature_file, scale)
+        # processes=None runs the chunks in this process, results only depend on seed and chunk
+        self.__std = delay_std(feature_file, scale) if std is None else std
+        self.__min_gap = min_gap / timedelta(minutes=1)
+        with open(adj_file, 'r') as file:
+            adj = json.load(file)
+        # pairs further apart than four standard deviations of both drifts are left out of the adjacency check
+        margin = 4 * max(a + l for a, l in self.__std.values())
+        self.__plan = make_plan(schedule, variables, self.__std, adj, margin)
+
+        sizes = [min(chunk, nscenarios - n) for n in range(0, nscenarios, chunk)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        if processes is None:
+            chunks = [run_chunk(self.__plan, s, n, self.__min_gap) for s, n in zip(seeds, sizes)]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                chunks = list(pool.map(run_chunk, [self.__plan] * len(sizes), seeds, sizes,
+                                       [self.__min_gap] * len(sizes)))
+        self.__stats = {key: sum(c[key] for c in chunks) for key in chunks[0]}
+
+    def return_bay_stats(self):
+        # "TER_k" -> mean per scenario (conflicts, wait minutes, knock-on waits, adjacency overlaps), p_conflict
+        n = self.__stats["scenarios"]
+        return {"%s_%s" % bay: {"turns": int((self.__plan["bay"] == b).sum()),
+                                "conflicts": float(self.__stats["conflicts"][b] / n),
+                                "p_conflict": float(self.__stats["scenarios_conflict"][b] / n),
+                                "wait": float(self.__stats["wait"][b] / n),
+                                "knock_on": float(self.__stats["knock_on"][b] / n),
+                                "adjacency": float(self.__stats["adjacency"][b] / n)}
+                for b, bay in enumerate(self.__plan["bays"])}
+
+    def return_summary(self):
+        n = self.__stats["scenarios"]
+        return {"scenarios": n, "p_conflict": self.__stats["any_conflict"] / n,
+                "conflicts": float(self.__stats["conflicts"].sum() / n), "wait": float(self.__stats["wait"].sum() / n),
+                "knock_on": float(self.__stats["knock_on"].sum() / n),
+                "adjacency": float(self.__stats["adjacency"].sum() / n),
+                "std": self.__std}
+
+    def buffer_quantiles(self, q: float = 0.95):
+        # category -> separation in minutes after a turn of that category that q of the scenarios stay within
+        quantiles = {}
+        for c, hist in zip(self.__plan["cats"], self.__stats["need"]):
+            if hist.sum():
+                quantiles[c] = float(np.searchsorted(np.cumsum(hist), q * hist.sum()) - HIST)
+        return quantiles
+
+    def return_plan(self):
+        return self.__plan
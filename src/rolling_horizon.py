@@ -0,0 +1,93 @@
+"""
+Rolling-horizon decomposition of the Bay Assignment Problem
+The schedule window is cut into overlapping time windows, each window is solved as its own MILP and the
+assignments in its commit region are fixed before moving on
+"""
+import time
+import random
+from datetime import timedelta
+
+from src.bay_assignment import LPSolver, select_flights
+from src.flight_schedule import Scheduler, ScheduleView
+
+
+class RollingHorizon(object):
+    def __init__(self, schedule: Scheduler, length: timedelta = timedelta(hours=4),
+                 overlap: timedelta = timedelta(hours=1), **options):
+        # options are passed on to every window's LPSolver (solver, backend, time_limit, time_cliques, ...)
+        assert length > overlap
+        self.__schedule = schedule
+        self.__length = length
+        self.__overlap = overlap
+        self.__options = options
+
+        self.__variables = {'w': {}, 'x': {}, 'y': {}}
+        self.__objective = 0
+        self.__windows = []
+
+        start = time.perf_counter()
+        self.solve()
+        self.__solvetime = time.perf_counter() - start
+
+    def solve(self):
+        turns = dict(self.__schedule.return_turns(), **self.__schedule.return_lturns()["FULL"])
+        tstart, tend = self.__schedule.return_horizon()
+        ws = min([tstart] + [turns[f]["ETA"] for f in turns])
+        last = max([tend] + [turns[f]["ETA"] for f in turns])
+        step = self.__length - self.__overlap
+        committed = set()
+
+        while len(committed) < len(turns):
+            we = ws + self.__length
+            final = we >= last
+            free = {f for f in turns if f not in committed and (final or turns[f]["ETA"] <= we)}
+            commit = {f for f in free if final or turns[f]["ETA"] < ws + step}
+            # committed turns still on the ground block their bays in this window
+            fixed = {f for f in committed if turns[f]["ETD"] >= ws}
+
+            if free:
+                start = time.perf_counter()
+                lp = LPSolver(nflights=len(free | fixed), schedule=ScheduleView(self.__schedule, free | fixed),
+                              fixed=select_flights(self.__variables, fixed), **self.__options)
+                solution = select_flights(lp.return_variables(), commit)
+                for var in solution:
+                    self.__variables[var].update(solution[var])
+                cost = lp.solution_cost(solution)
+                self.__objective += cost
+                self.__windows.append({"start": ws, "end": we, "free": len(free), "fixed": len(fixed),
+                                       "committed": len(commit), "objective": cost,
+                                       "solvetime": time.perf_counter() - start})
+            committed |= commit
+            ws += step
+
+    def return_variables(self):
+        return self.__variables
+
+    def return_objective(self):
+        return self.__objective
+
+    def return_windows(self):
+        return self.__windows
+
+    def return_solvetime(self):
+        return self.__solvetime
+
+
+def rolling_gap(schedule: Scheduler, length: timedelta = timedelta(hours=4), overlap: timedelta = timedelta(hours=1),
+                **options):
+    # rolling-horizon objective against the monolithic model, only sensible on small instances
+    rolling = RollingHorizon(schedule, length=length, overlap=overlap, **options)
+    start = time.perf_counter()
+    full = LPSolver(nflights=len(schedule.return_turns()) + len(schedule.return_lturns()["FULL"]),
+                    schedule=schedule, **options)
+    full_time = time.perf_counter() - start
+    return {"rolling": rolling.return_objective(), "full": full.return_objective(),
+            "gap": (rolling.return_objective() - full.return_objective()) / full.return_objective(),
+            "rolling_time": rolling.return_solvetime(), "full_time": full_time,
+            "windows": rolling.return_windows()}
+
+
+if __name__ == "__main__":
+    random.seed(9999)
+    ac_schedule = Scheduler(nflights=60)
+    print(rolling_gap(ac_schedule, backend="highs", time_cliques=True))
@@ -0,0 +1,172 @@
+"""
+Compact run output
+A run is stored as typed NumPy columns (<name>.npz: turns, assignment and bay table) next to a small JSON manifest
+(<name>.manifest.json: codes, horizon, objective and run metadata), RunData loads the columns only when they are read
+"""
+import os
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+
+VERSION = 1
+DATE_FORMAT = '%Y/%m/%d %H:%M:%S'
+
+
+def minutes(start: datetime, times: list):
+    return np.array([(t - start) // timedelta(minutes=1) for t in times], dtype=np.int32)
+
+
+def write_run(path: str, schedule, variables: dict, **meta):
+    # path without extension, meta (objective, status, solvetime, instrument, ...) goes into the manifest
+    tstart, tend = schedule.return_horizon()
+    turns, lturns = schedule.return_turns(), schedule.return_lturns()
+    bays, ac = schedule.return_bays(), schedule.return_ac()
+    rows = dict(turns, **lturns["FULL"], **lturns["SPLIT"])
+    ids = list(rows)
+
+    terminals = list(bays)
+    tcode = {ter: n for n, ter in enumerate(terminals)}
+    ac_names = [ac[x]["AC"] for x in ac]
+    acode = {name: n for n, name in enumerate(ac_names)}
+
+    flights = [int(i.rstrip("PAD")) for i in ids]
+    assigned = [variables['x'].get(i) for i in ids]
+    prefs = [rows[i].get("pref") for i in ids]
+    columns = {
+        "turn": np.array(ids),
+        "flight": np.array(flights, dtype=np.int32),
+        "part": np.array([i[-1] if i[-1] in "PAD" else "" for i in ids]),
+        "ac": np.array([acode[rows[i]["AC"]] for i in ids], dtype=np.int16),
+        "ter": np.array([tcode[rows[i]["ter"]] for i in ids], dtype=np.int8),
+        "eta": minutes(tstart, [rows[i]["ETA"] for i in ids]),
+        "etd": minutes(tstart, [rows[i]["ETD"] for i in ids]),
+        "tow": np.array([bool(rows[i].get("tow")) for i in ids]),
+        "pref_ter": np.array([tcode[p["ter"]] if p else -1 for p in prefs], dtype=np.int8),
+        "pref_bay": np.array([p["bay"] if p else 0 for p in prefs], dtype=np.int16),
+        "pref_val": np.array([p["val"] if p else 0 for p in prefs], dtype=np.int16),
+        # assignment per turn, -1 where the turn has no bay
+        "bay_ter": np.array([tcode[x['type']] if x else -1 for x in assigned], dtype=np.int8),
+        "bay_id": np.array([int(x['id']) if x else 0 for x in assigned], dtype=np.int16),
+        "towed": np.array([f in variables['w'] for f in flights]),
+        "nobay": np.array([i.isdigit() and f in variables['y'] for i, f in zip(ids, flights)]),
+        # bay table
+        "bays_ter": np.array([tcode[ter] for ter in bays for k in bays[ter]], dtype=np.int8),
+        "bays_id": np.array([k for ter in bays for k in bays[ter]], dtype=np.int16),
+        "bays_size": np.array([bays[ter][k]["size"] for ter in bays for k in bays[ter]]),
+        "bays_dist": np.array([bays[ter][k]["dist"] for ter in bays for k in bays[ter]], dtype=float),
+        "bays_cat": np.array(["".join(bays[ter][k]["cat"]) for ter in bays for k in bays[ter]]),
+    }
+    # flight ids of a loaded schedule (src/ingest.py) next to the flight numbers the model uses
+    flight_ids = schedule.return_flight_ids()
+    if flight_ids is not None:
+        columns["flight_id"] = np.array([flight_ids[str(f)] for f in flights])
+    np.savez_compressed(path + ".npz", **columns)
+
+    manifest = {"version": VERSION, "date_format": DATE_FORMAT, "tstart": tstart.strftime(DATE_FORMAT),
+                "tend": tend.strftime(DATE_FORMAT), "nflights": len(turns) + len(lturns["FULL"]),
+                "terminals": terminals, "ac": {str(x): ac[x] for x in ac}, "ac_names": ac_names,
+                "columns": {name: [str(col.dtype), len(col)] for name, col in columns.items()},
+                "costs": schedule.return_cost_data(), "meta": meta}
+    with open(path + ".manifest.json", 'w+') as file:
+        file.write(json.dumps(manifest, default=str))
+    return path
+
+
+class RunData(object):
+    def __init__(self, path: str):
+        # path without extension or of either file, the column file is opened on the first column access
+        self.__path = path[:-len(".manifest.json")] if path.endswith(".manifest.json") else os.path.splitext(path)[0]
+        with open(self.__path + ".manifest.json", 'r') as file:
+            self.__manifest = json.load(file)
+        self.__tstart = datetime.strptime(self.__manifest["tstart"], DATE_FORMAT)
+        self.__npz = None
+        self.__columns = {}
+        self.__legacy = {}
+
+    def column(self, name: str):
+        if name not in self.__columns:
+            if self.__npz is None:
+                self.__npz = np.load(self.__path + ".npz")
+            self.__columns[name] = self.__npz[name]
+        return self.__columns[name]
+
+    def columns(self, *names):
+        return {name: self.column(name) for name in names}
+
+    def times(self, name: str):
+        # eta/etd column as datetimes
+        return [self.__tstart + timedelta(minutes=int(m)) for m in self.column(name)]
+
+    def occupations(self):
+        # gate -> [flight, start, end] sorted by start, as graphics.extract_occupations_per_bay
+        bay_ter, bay_id, flight = self.column("bay_ter"), self.column("bay_id"), self.column("flight")
+        eta, etd = self.column("eta"), self.column("etd")
+        terminals = self.__manifest["terminals"]
+        distr = {"%s_%s" % (terminals[t], k): [] for t, k in zip(self.column("bays_ter"), self.column("bays_id"))}
+        for n in np.flatnonzero(bay_ter >= 0)[np.argsort(eta[bay_ter >= 0], kind="stable")]:
+            distr["%s_%s" % (terminals[bay_ter[n]], bay_id[n])].append(
+                [int(flight[n]), self.__tstart + timedelta(minutes=int(eta[n])),
+                 self.__tstart + timedelta(minutes=int(etd[n]))])
+        return distr
+
+    def flight_ac(self):
+        # flight -> aircraft name
+        names = self.__manifest["ac_names"]
+        part = self.column("part")
+        return {int(f): names[a] for f, a, p in zip(self.column("flight"), self.column("ac"), part) if not p}
+
+    def flight_ids(self):
+        # flight -> flight id of the loaded file, None when the schedule was generated
+        if "flight_id" not in self.__manifest["columns"]:
+            return None
+        return {int(f): str(i) for f, i in zip(self.column("flight"), self.column("flight_id"))}
+
+    def return_manifest(self):
+        return self.__manifest
+
+    def __getitem__(self, key: str):
+        # the keys of the JSON run log, built once on first use for code that still reads that layout
+        if key not in self.__legacy:
+            self.__legacy[key] = self.legacy(key)
+        return self.__legacy[key]
+
+    def legacy(self, key: str):
+        manifest = self.__manifest
+        terminals = manifest["terminals"]
+        if key == "date_format":
+            return manifest["date_format"]
+        if key == "ac":
+            return manifest["ac"]
+        if key == "bays":
+            bays = {ter: {} for ter in terminals}
+            for t, k, size, dist, cat in zip(*self.columns("bays_ter", "bays_id", "bays_size", "bays_dist",
+                                                          "bays_cat").values()):
+                bays[terminals[t]][str(k)] = {"cat": list(cat), "size": str(size), "dist": float(dist)}
+            return bays
+        if key == "variables":
+            turn, bay_ter, bay_id, flight = self.columns("turn", "bay_ter", "bay_id", "flight").values()
+            return {'w': {str(f): 1.0 for f in np.unique(flight[self.column("towed")])},
+                    'x': {str(i): {'type': terminals[t], 'id': str(k)}
+                          for i, t, k in zip(turn, bay_ter, bay_id) if t >= 0},
+                    'y': {str(f): 1.0 for f in flight[self.column("nobay")]}}
+        if key in ("turns", "lturns", "schedule"):
+            turn, part, ter, ac, tow = self.columns("turn", "part", "ter", "ac", "tow").values()
+            eta = [t.strftime(DATE_FORMAT) for t in self.times("eta")]
+            etd = [t.strftime(DATE_FORMAT) for t in self.times("etd")]
+            records = {str(i): {"AC": manifest["ac_names"][a], "ETA": s, "ETD": e, "ter": terminals[t]}
+                       for i, a, s, e, t in zip(turn, ac, eta, etd, ter)}
+            for i in turn[tow]:
+                records[str(i)]["tow"] = True
+            pref = self.column("pref_ter") >= 0
+            for i, t, k, val in zip(turn[pref], *(self.column(c)[pref] for c in ["pref_ter", "pref_bay", "pref_val"])):
+                records[str(i)]["pref"] = {"ter": terminals[t], "bay": int(k), "val": int(val)}
+            full = {str(i)[:-1] for i, p in zip(turn, part) if p == "P"}
+            if key == "turns":
+                return {i: r for i, r in records.items() if i.isdigit() and i not in full}
+            if key == "lturns":
+                return {"FULL": {i: r for i, r in records.items() if i in full},
+                        "SPLIT": {i: r for i, r in records.items() if not i.isdigit()}}
+            return {"nflights": manifest["nflights"], "tstart": manifest["tstart"], "tend": manifest["tend"],
+                    "costs": manifest.get("costs"), "schedule": {i: r for i, r in records.items() if i.isdigit()}}
+        raise KeyError(key)
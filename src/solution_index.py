@@ -0,0 +1,117 @@
+"""
+Query index over a solved assignment
+Built once from a solve() result: per bay the occupied windows sorted by start with their turns, and per flight the
+bays and windows it uses, so "who is on DOM_3 at 14:20", "where is flight 12" and "which bays are free from 15:00 to
+16:30" are bisect lookups instead of walks over the variables and turns
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from src.bay_assignment import base_flight
+from src.compat import ac_index
+from src.validator import load_run
+
+
+class SolutionIndex(object):
+    def __init__(self, turns: dict, lturns: dict, bays: dict, ac: dict, variables: dict):
+        # windows are the unbuffered (ETA, ETD), the model shifts both ends by tbuf so the free windows agree with it
+        self.__bays = bays
+        self.__ac = ac_index(ac)
+        self.__map_turns = dict(turns, **lturns["FULL"], **lturns["SPLIT"])
+        self.__towed = {str(l) for l in variables['w']}
+        self.__nobay = {str(i) for i in variables['y']}
+
+        occupied = {(ter, k): [] for ter in bays for k in bays[ter]}
+        self.__flights = {}
+        for i, x in variables['x'].items():
+            i, bay = str(i), (x['type'], int(x['id']))
+            segment = (self.__map_turns[i]["ETA"], self.__map_turns[i]["ETD"], i)
+            occupied[bay].append(segment)
+            self.__flights.setdefault(base_flight(i), []).append((bay,) + segment)
+
+        # per bay: starts, ends and turns in start order, the longest window bounds the backwards search
+        self.__index = {}
+        for bay, segments in occupied.items():
+            segments.sort()
+            self.__index[bay] = ([s for s, _, _ in segments], [e for _, e, _ in segments], [i for _, _, i in segments],
+                                 max((e - s for s, e, _ in segments), default=timedelta(0)))
+        for segments in self.__flights.values():
+            segments.sort(key=lambda seg: seg[1])
+
+    def overlapping(self, ter: str, k: int, start: datetime, end: datetime):
+        # turns on the bay whose window shares a moment with [start, end], in start order
+        starts, ends, turns, span = self.__index[ter, k]
+        lo = bisect_left(starts, start - span)
+        hi = bisect_right(starts, end)
+        return [turns[n] for n in range(lo, hi) if ends[n] >= start]
+
+    def bay_at(self, ter: str, k: int, t: datetime):
+        return self.overlapping(ter, k, t, t)
+
+    def at(self, t: datetime):
+        # occupied bays at moment t -> turns
+        occupied = {}
+        for bay in self.__index:
+            turns = self.overlapping(*bay, t, t)
+            if turns:
+                occupied[bay] = turns
+        return occupied
+
+    def flight(self, flight):
+        # bays and windows of a flight: [(ter, k, start, end, turn)], empty without a bay
+        return [(ter, k, s, e, i) for (ter, k), s, e, i in self.__flights.get(str(flight), [])]
+
+    def flight_bay(self, flight, t: datetime = None):
+        # bay of a flight, at moment t for a towed long turn
+        for (ter, k), s, e, _ in self.__flights.get(str(flight), []):
+            if t is None or s <= t <= e:
+                return ter, k
+        return None
+
+    def compatible(self, AC: str):
+        cat = self.__ac[AC]["cat"]
+        return [bay for bay in self.__index if cat in self.__bays[bay[0]][bay[1]]["cat"]]
+
+    def free_bays(self, start: datetime, end: datetime, AC: str = None, terminals: list = None):
+        # bays without any turn in [start, end], only those that take the aircraft type if given
+        bays = self.__index if AC is None else self.compatible(AC)
+        return [bay for bay in bays if (terminals is None or bay[0] in terminals)
+                and not self.overlapping(*bay, start, end)]
+
+    def free_windows(self, ter: str, k: int, start: datetime, end: datetime, min_length: timedelta = None):
+        # open gaps between the turns on the bay inside [start, end], at least min_length long
+        starts, ends, _, span = self.__index[ter, k]
+        windows = []
+        t = start
+        for n in range(bisect_left(starts, start - span), bisect_right(starts, end)):
+            if ends[n] < start:
+                continue
+            if starts[n] > t:
+                windows.append((t, starts[n]))
+            t = max(t, ends[n])
+        if t < end:
+            windows.append((t, end))
+        return [w for w in windows if min_length is None or w[1] - w[0] >= min_length]
+
+    def occupations(self):
+        # "TER_k" -> [flight, start, end] sorted by start, as graphics.extract_occupations_per_bay
+        return {"%s_%s" % bay: [[int(base_flight(i)), s, e] for s, e, i in zip(starts, ends, turns)]
+                for bay, (starts, ends, turns, _) in self.__index.items()}
+
+    def return_towed(self):
+        return self.__towed
+
+    def return_nobay(self):
+        return self.__nobay
+
+
+def index_schedule(schedule, variables: dict):
+    # solve() result of an LPSolver, heuristic, RollingHorizon or TerminalDecomposition against its Scheduler
+    return SolutionIndex(schedule.return_turns(), schedule.return_lturns(), schedule.return_bays(),
+                         schedule.return_ac(), variables)
+
+
+def index_run(data):
+    # run log as LPSolver.return_data, the saved run JSON or a RunData
+    run = load_run(data)
+    return SolutionIndex(run["turns"], run["lturns"], run["bays"], run["ac"], run["variables"])
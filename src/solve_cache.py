@@ -0,0 +1,192 @@
+"""
+Content-addressed cache of built models and solutions
+An entry is keyed by a hash of the generated schedule, every programdata/*.json file and the model options: <key>.npz
+holds the model in matrix form and <key>.json the solutions per solver setting. A cached model is solved again with
+HiGHS without rebuilding anything, entries are evicted least recently used once the directory outgrows max_bytes
+"""
+import os
+import json
+import glob
+import time
+import hashlib
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+
+import numpy as np
+from scipy.optimize import Bounds
+from scipy.sparse import csr_matrix
+
+from src.bay_assignment import LPSolver
+from src.matrix_model import lp_matrices, solve_highs, highs_status, status_name
+
+# LPSolver arguments that change the model, the remaining ones only change how it is solved
+MODEL_OPTIONS = ["tbuf", "adj_file", "time_cliques", "fixed", "offsets", "symmetry"]
+SOLVER_OPTIONS = ["backend", "solver", "time_limit", "threads", "mip_gap", "heuristic"]
+
+
+def canonical(value):
+    # JSON-able form with a fixed order, mappings with non-string keys become sorted [key, value] pairs
+    if isinstance(value, Mapping):
+        return sorted(([canonical(k), canonical(v)] for k, v in value.items()), key=json.dumps)
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, set):
+        return sorted((canonical(v) for v in value), key=json.dumps)
+    if isinstance(value, (datetime, timedelta)):
+        return str(value)
+    return value
+
+
+def solver_options(solver):
+    # a PuLP solver as its class and settings, so a CBC and a CPLEX answer or two time limits get different keys
+    if solver is None:
+        return None
+    return {"class": type(solver).__name__, "timeLimit": solver.timeLimit, "options": solver.optionsDict}
+
+
+def digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else json.dumps(canonical(part)).encode())
+    return h.hexdigest()
+
+
+def parse_solution(names: list, x: np.ndarray):
+    # variable values in solve() result format, as LPSolver.parse_variables
+    result = {'w': {}, 'x': {}, 'y': {}}
+    for name in (names[n] for n in np.flatnonzero(np.abs(x - 1) < 0.0001)):
+        vals = name.split('_')
+        if vals[0] != 'x':
+            result[vals[0]][int(vals[1])] = 1.0
+        else:
+            result[vals[0]][vals[1]] = {'type': vals[2], 'id': vals[3]}
+    return result
+
+
+class SolveCache(object):
+    def __init__(self, cache_dir: str = r"./outputdata/cache", max_bytes: int = 512 * 2 ** 20,
+                 data_dir: str = r"./programdata"):
+        self.__dir = cache_dir
+        self.__max_bytes = max_bytes
+        os.makedirs(self.__dir, exist_ok=True)
+        # the input files are read once, a changed file gives new keys for every schedule
+        files = []
+        for p in sorted(glob.glob(os.path.join(data_dir, "*.json"))):
+            with open(p, 'rb') as file:
+                files.append(os.path.basename(p).encode() + file.read())
+        self.__files = digest(*files)
+        self.__hits = {"solution": 0, "model": 0, "miss": 0}
+
+    def key(self, schedule, **options):
+        model = {k: options.get(k) for k in MODEL_OPTIONS}
+        if model["adj_file"] is not None:
+            with open(model["adj_file"], 'rb') as file:
+                model["adj_file"] = digest(file.read())
+        return digest(self.__files, model, schedule.return_turns(), schedule.return_lturns(),
+                      schedule.return_bays(), schedule.return_ac(), schedule.return_cost_data())
+
+    def path(self, key: str, ext: str):
+        return os.path.join(self.__dir, key + ext)
+
+    def touch(self, key: str):
+        # access time for the LRU order, kept in the modification time so it survives noatime mounts
+        for ext in [".npz", ".json"]:
+            if os.path.exists(self.path(key, ext)):
+                os.utime(self.path(key, ext))
+
+    def get_model(self, key: str):
+        if not os.path.exists(self.path(key, ".npz")):
+            return None
+        with np.load(self.path(key, ".npz")) as data:
+            A = csr_matrix((data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"]))
+            return (list(data["names"]), data["c"], A, data["lb"], data["ub"],
+                    Bounds(data["col_lb"], data["col_ub"]), data["integrality"])
+
+    def put_model(self, key: str, prob):
+        variables, c, A, lb, ub, bounds, integrality = lp_matrices(prob)
+        tmp = self.path(key, ".tmp.npz")
+        np.savez_compressed(tmp, names=np.array([v.name for v in variables]), c=c, data=A.data, indices=A.indices,
+                            indptr=A.indptr, shape=np.array(A.shape), lb=lb, ub=ub, col_lb=bounds.lb,
+                            col_ub=bounds.ub, integrality=integrality)
+        # written aside and moved, so a parallel reader never sees half a file
+        os.replace(tmp, self.path(key, ".npz"))
+
+    def get_solutions(self, key: str):
+        try:
+            with open(self.path(key, ".json"), 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def put_solution(self, key: str, solver_key: str, record: dict):
+        solutions = self.get_solutions(key)
+        solutions[solver_key] = record
+        tmp = self.path(key, ".tmp.json")
+        with open(tmp, 'w+') as file:
+            file.write(json.dumps(solutions))
+        os.replace(tmp, self.path(key, ".json"))
+
+    def solve(self, schedule, **options):
+        # solution of the schedule under the LPSolver options: stored solution, cached model or a full build
+        key = self.key(schedule, **options)
+        solver_key = json.dumps(canonical(dict({k: options.get(k) for k in SOLVER_OPTIONS},
+                                               solver=solver_options(options.get("solver")))))
+        record = self.get_solutions(key).get(solver_key)
+        if record is not None:
+            self.__hits["solution"] += 1
+        else:
+            # a cached model is solved exactly with HiGHS, so it only answers exact HiGHS requests; the pulp backend
+            # and the standalone heuristic run through LPSolver
+            model = self.get_model(key) if options.get("backend") == "highs" and \
+                options.get("heuristic") != "only" else None
+            start = time.perf_counter()
+            if model is not None:
+                self.__hits["model"] += 1
+                names, c, A, lb, ub, bounds, integrality = model
+                res = solve_highs(c, A, lb, ub, bounds=bounds, integrality=integrality,
+                                  time_limit=options.get("time_limit"), mip_gap=options.get("mip_gap"))
+                record = {"status": status_name(*highs_status(res)),
+                          "objective": None if res.x is None else float(res.fun),
+                          "variables": parse_solution(names, res.x) if res.x is not None else
+                          {'w': {}, 'x': {}, 'y': {}}}
+            else:
+                self.__hits["miss"] += 1
+                lp = LPSolver(nflights=len(schedule.return_turns()) + len(schedule.return_lturns()["FULL"]),
+                              schedule=schedule, **options)
+                self.put_model(key, lp.return_problem())
+                record = {"status": lp.return_status(), "objective": lp.return_objective(),
+                          "variables": lp.return_variables()}
+            record["solvetime"] = time.perf_counter() - start
+            self.put_solution(key, solver_key, record)
+            self.evict(keep=key)
+        self.touch(key)
+        # JSON round trip keeps the result types the same for stored and fresh solutions, w and y are keyed by the
+        # flight number as in LPSolver.parse_variables
+        record = json.loads(json.dumps(record))
+        for var in ['w', 'y']:
+            record["variables"][var] = {int(f): v for f, v in record["variables"][var].items()}
+        return dict(record, key=key)
+
+    def evict(self, keep: str = None):
+        # least recently used entries go first until the directory fits max_bytes, the entry keep always stays
+        entries = {}
+        for p in glob.glob(os.path.join(self.__dir, "*")):
+            key = os.path.basename(p).split(".")[0]
+            size, used = entries.get(key, (0, 0))
+            entries[key] = (size + os.path.getsize(p), max(used, os.path.getmtime(p)))
+        total = sum(size for size, _ in entries.values())
+        for key, (size, _) in sorted(entries.items(), key=lambda e: e[1][1]):
+            if total <= self.__max_bytes:
+                break
+            if key == keep:
+                continue
+            for ext in [".npz", ".json"]:
+                if os.path.exists(self.path(key, ext)):
+                    os.remove(self.path(key, ext))
+            total -= size
+
+    def return_hits(self):
+        return self.__hits
+
+    def return_size(self):
+        return sum(os.path.getsize(p) for p in glob.glob(os.path.join(self.__dir, "*")))
@@ -0,0 +1,104 @@
+"""
+Cost parameter sweeps on one built model
+Tow and no-bay costs per category, the terminal penalty and the preference value only enter the objective, so every
+branch of a sweep builds the Scheduler and LPSolver once and walks its scenarios with LPSolver.update_costs, each solve
+warm started from the previous one; independent branches run on worker processes
+"""
+import os
+import time
+import json
+import random
+from datetime import datetime
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+
+from src.bay_assignment import LPSolver
+from src.flight_schedule import Scheduler
+
+# update_costs arguments a scenario may set
+PARAMS = ["tow", "nobay", "ter_penalty", "pref_val"]
+
+
+def make_scenarios(**values):
+    # full grid of the given update_costs arguments, e.g. make_scenarios(ter_penalty=[1, 2], pref_val=[2, 5, 10])
+    names = [name for name in PARAMS if name in values]
+    return [dict(zip(names, combo)) for combo in product(*(values[name] for name in names))]
+
+
+def scale_costs(costs: dict, factors: list):
+    # per-category cost dicts scaled by each factor, e.g. scale_costs(tow_costs, [0.5, 1, 2])
+    return [{cat: val * f for cat, val in costs.items()} for f in factors]
+
+
+def run_branch(schedule, scenarios: list, options: dict, keep_variables: bool = False):
+    # worker: one model for the whole branch, the scenarios are solved in the given order
+    start = time.perf_counter()
+    lp = LPSolver(nflights=len(schedule.return_turns()) + len(schedule.return_lturns()["FULL"]),
+                  schedule=schedule, **options)
+    build = time.perf_counter() - start - lp.return_solvetime()
+    # every scenario is relative to the schedule's own costs, not to the scenario before it
+    tow, nobay, ter_penalty = lp.return_cost_data()
+    base = {"tow": tow, "nobay": nobay, "ter_penalty": ter_penalty, "pref_val": 0}
+    results = []
+    for scenario in scenarios:
+        start = time.perf_counter()
+        variables = lp.update_costs(**dict(base, **scenario))
+        result = {"scenario": scenario, "status": lp.return_status(), "objective": lp.return_objective(),
+                  "solvetime": lp.return_solvetime(), "runtime": time.perf_counter() - start,
+                  "tows": len(variables['w']), "nobay": len(variables['y'])}
+        if keep_variables:
+            result["variables"] = variables
+        results.append(result)
+    return build, results
+
+
+class Sweep(object):
+    def __init__(self, schedule: Scheduler, scenarios: list, branches: int = 1, processes: int = None,
+                 keep_variables: bool = False, **options):
+        # scenarios are dicts of update_costs arguments, options go to LPSolver; the scenarios are split into
+        # branches of neighbouring scenarios, so keep them ordered (make_scenarios does) for good warm starts
+        self.__scenarios = scenarios
+        self.__branches = max(1, min(branches, len(scenarios)))
+        self.__options = options
+        size = -(-len(scenarios) // self.__branches)
+        parts = [scenarios[n:n + size] for n in range(0, len(scenarios), size)]
+
+        start = time.perf_counter()
+        if processes is None and len(parts) == 1:
+            runs = [run_branch(schedule, parts[0], options, keep_variables)]
+        else:
+            with ProcessPoolExecutor(max_workers=processes or len(parts)) as pool:
+                runs = list(pool.map(run_branch, [schedule] * len(parts), parts, [options] * len(parts),
+                                     [keep_variables] * len(parts)))
+        self.__runtime = time.perf_counter() - start
+        self.__build = [build for build, _ in runs]
+        self.__results = [r for _, results in runs for r in results]
+
+    def return_results(self):
+        return self.__results
+
+    def return_runtime(self):
+        return self.__runtime
+
+    def return_build(self):
+        # model build time per branch, paid once per branch instead of once per scenario
+        return self.__build
+
+    def write(self, path: str = None):
+        path = fr'./outputdata/sweep_{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}.json' if path is None else path
+        with open(path, 'w+') as file:
+            file.write(json.dumps({"branches": self.__branches, "runtime": self.__runtime, "build": self.__build,
+                                   "options": {k: str(v) for k, v in self.__options.items()},
+                                   "results": self.__results}, default=str))
+        return path
+
+
+if __name__ == "__main__":
+    random.seed(2021)
+    ac_schedule = Scheduler(nflights=40)
+    tow_costs, nobay_costs, penalty = ac_schedule.return_cost_data()
+    sweep = Sweep(ac_schedule, make_scenarios(ter_penalty=[penalty * f for f in [0.5, 1, 1.5, 2]],
+                                              tow=scale_costs(tow_costs, [0.5, 1, 2])),
+                  branches=min(4, os.cpu_count() or 1), backend="highs")
+    for row in sweep.return_results():
+        print(row["scenario"], row["objective"], row["tows"], row["nobay"])
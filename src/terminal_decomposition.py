@@ -0,0 +1,205 @@
+"""
+Per-terminal decomposition of the Bay Assignment Problem
+Every terminal is solved on its own worker process together with the shared remote bays, a price on each
+moment of remote bay use coordinates the terminals and a final repair model settles cross-terminal moves
+"""
+import time
+import json
+import random
+from collections import ChainMap, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from src.bay_assignment import LPSolver, base_flight, select_flights
+from src.compat import CompatIndex, adj_table
+from src.flight_schedule import Scheduler, ScheduleView
+from src.intervals import IntervalIndex, IntervalSet
+
+
+def solve_terminal(schedule: Scheduler, flights: set, terminals: list, offsets: dict, options: dict):
+    # worker: one terminal subproblem, returns its assignment and the true (price free) cost per flight
+    lp = LPSolver(nflights=len(flights), schedule=ScheduleView(schedule, flights, terminals), offsets=offsets,
+                  **options)
+    return lp.return_variables(), lp.flight_costs(lp.return_variables())
+
+
+class TerminalDecomposition(object):
+    def __init__(self, schedule: Scheduler, max_iter: int = 10, processes: int = None,
+                 tbuf: timedelta = None, adj_file: str = r"./programdata/adj.json", **options):
+        # options are passed on to every subproblem's LPSolver (solver, backend, time_limit, time_cliques, ...)
+        self.__schedule = schedule
+        self.__max_iter = max_iter
+        self.__processes = processes
+        self.__tbuf = timedelta(minutes=15) if tbuf is None else tbuf
+        self.__options = dict(options, tbuf=self.__tbuf, adj_file=adj_file)
+
+        with open(adj_file, 'r') as file:
+            self.__adj = json.load(file)
+
+        self.__variables = {'w': {}, 'x': {}, 'y': {}}
+        self.__costs = {}
+        self.__iterations = []
+        self.__converged = False
+
+        start = time.perf_counter()
+        self.solve()
+        self.__solvetime = time.perf_counter() - start
+
+    def window(self, flight: str):
+        turns = ChainMap(self.__schedule.return_turns(), self.__schedule.return_lturns()["FULL"],
+                         self.__schedule.return_lturns()["SPLIT"])
+        return turns[flight]["ETA"] + self.__tbuf, turns[flight]["ETD"] + self.__tbuf
+
+    def solve(self):
+        turns = self.__schedule.return_turns()
+        lturns = self.__schedule.return_lturns()
+        fturns = ChainMap(turns, lturns["FULL"])
+        bays = self.__schedule.return_bays()
+
+        groups = defaultdict(set)
+        for f in fturns:
+            groups[fturns[f]["ter"]].add(f)
+        shared = [ter for ter in bays if ter not in groups]
+        groups = {ter: flights for ter, flights in groups.items() if ter in bays}
+
+        # every maximal overlap set of turns that may use a shared bay gets its own price
+        index = self.__index_compat = CompatIndex(self.__schedule.return_ac(), bays,
+                                                  ChainMap(turns, lturns["FULL"], lturns["SPLIT"]))
+        windows = IntervalIndex({i: self.window(i) for i in index.return_turns()})
+        cliques = {}
+        for ter in shared:
+            for k in bays[ter]:
+                members = {i for i in index.turns(ter, k) if not i.endswith(("A", "D"))}
+                for n, clique in enumerate(windows.cliques(keys=members)):
+                    if len(set(base_flight(i) for i in clique)) > 1:
+                        cliques[ter, k, n] = clique
+        prices = dict.fromkeys(cliques, 0.)
+        tried = {f: {fturns[f]["ter"]} for f in fturns}
+        cap = [index.cap(i) * bays[ter][k]["dist"] for ter, k, n in cliques for i in cliques[ter, k, n]]
+        step = sum(cap) / len(cap) if cap else 0.
+
+        with ProcessPoolExecutor(max_workers=self.__processes or len(groups) or 1) as pool:
+            for it in range(self.__max_iter):
+                offsets = defaultdict(float)
+                for (ter, k, n), clique in cliques.items():
+                    for i in clique:
+                        offsets[i, ter, k] += prices[ter, k, n]
+
+                start = time.perf_counter()
+                groups = {ter: flights for ter, flights in groups.items() if flights}
+                futures = {ter: pool.submit(solve_terminal, self.__schedule, flights, [ter] + shared,
+                                            {key: v for key, v in offsets.items() if base_flight(key[0]) in flights},
+                                            self.__options) for ter, flights in groups.items()}
+                results = {ter: future.result() for ter, future in futures.items()}
+
+                # subgradient on the dualised "at most one turn per shared bay at this moment" rows
+                usage = {key: sum(results[ter][0]['x'].get(i) == {'type': key[0], 'id': str(key[1])}
+                                  for ter in results for i in clique) for key, clique in cliques.items()}
+                violated = [key for key in cliques if usage[key] > 1]
+
+                # flights left without a bay by their own terminal are offered to a terminal they have not tried
+                moves = 0
+                for ter, (variables, _) in results.items():
+                    for i in map(str, variables['y']):
+                        options = [t for t, k in index.bays(i) if t in groups and t not in tried[i]]
+                        if options:
+                            groups[ter].discard(i)
+                            groups[options[0]].add(i)
+                            tried[i].add(options[0])
+                            moves += 1
+
+                self.__iterations.append({"iteration": it, "violations": len(violated), "moves": moves,
+                                          "objective": sum(sum(c.values()) for _, c in results.values()),
+                                          "solvetime": time.perf_counter() - start})
+                if not violated and not moves:
+                    self.__converged = True
+                    break
+                # prices on contested moments grow geometrically until one terminal yields, idle ones decay
+                for key in cliques:
+                    if usage[key] > 1:
+                        prices[key] += step * 2 ** it * (usage[key] - 1)
+                    elif usage[key] == 0:
+                        prices[key] /= 2
+
+        for ter, (variables, costs) in results.items():
+            for var in variables:
+                self.__variables[var].update(variables[var])
+            self.__costs.update(costs)
+        self.repair(*self.merge(shared))
+
+    def merge(self, shared: list):
+        # drop flights that still collide on a shared bay, their turns go back into the repair model together with
+        # the shared bays they collided on or could use
+        table = {pair: set(b) for pair, b in adj_table(self.__adj, self.__schedule.return_bays()).items()}
+        index = self.__index_compat
+        occupied = defaultdict(IntervalSet)
+        dropped = set()
+        contested = set()
+        for i in sorted(self.__variables['x'], key=lambda f: self.window(f)):
+            ter, k = self.__variables['x'][i]['type'], int(self.__variables['x'][i]['id'])
+            if ter not in shared or base_flight(i) in dropped:
+                continue
+            start, end = self.window(i)
+            blocked = [j for j in occupied[ter, k].overlapping(start, end) if base_flight(j) != base_flight(i)]
+            blocked += [j for j in occupied[ter, k + 2].overlapping(start, end) if base_flight(j) != base_flight(i)
+                        and (ter, k) in table.get((index.cat(i), index.cat(j)), ())]
+            blocked += [j for j in occupied[ter, k - 2].overlapping(start, end) if base_flight(j) != base_flight(i)
+                        and (ter, k - 2) in table.get((index.cat(j), index.cat(i)), ())]
+            if blocked:
+                dropped.add(base_flight(i))
+                contested.add((ter, k))
+                contested.update((self.__variables['x'][j]['type'], int(self.__variables['x'][j]['id']))
+                                 for j in blocked)
+            else:
+                occupied[ter, k].add(i, start, end)
+        # a flight without a bay contests every shared bay it fits
+        for i in map(str, self.__variables['y']):
+            contested.update(bay for bay in index.bays(i) if bay[0] in shared)
+        return dropped, contested
+
+    def repair(self, dropped: set, contested: set):
+        # unassigned and dropped flights are re-solved over all terminals, the flights they overlap on the contested
+        # shared bays and their k-2/k+2 neighbours are re-solved with them, the other overlapping flights stay fixed
+        repair = dropped | {str(i) for i in self.__variables['y']}
+        if not repair:
+            return
+        fturns = ChainMap(self.__schedule.return_turns(), self.__schedule.return_lturns()["FULL"])
+        index = IntervalIndex({f: self.window(f) for f in fturns})
+        contested |= {(ter, k + d) for ter, k in contested for d in [-2, 2]}
+        used = defaultdict(set)
+        for i, x in self.__variables['x'].items():
+            used[base_flight(str(i))].add((x['type'], int(x['id'])))
+        repair |= {j for f in repair for j in index.overlapping(*self.window(f)) if used[j] & contested}
+        kept = select_flights(self.__variables, set(self.__costs) - repair)
+        fixed = {j for f in repair for j in index.overlapping(*self.window(f)) if j not in repair}
+
+        lp = LPSolver(nflights=len(repair | fixed), schedule=ScheduleView(self.__schedule, repair | fixed),
+                      fixed=select_flights(kept, fixed), **self.__options)
+        solution = select_flights(lp.return_variables(), repair)
+        self.__variables = kept
+        for var in solution:
+            self.__variables[var].update(solution[var])
+        self.__costs.update(lp.flight_costs(solution))
+
+    def return_variables(self):
+        return self.__variables
+
+    def return_objective(self):
+        return sum(self.__costs.values())
+
+    def return_iterations(self):
+        return self.__iterations
+
+    def return_converged(self):
+        # False when the price loop stopped at max_iter with violations or moves left, merge/repair settled them
+        return self.__converged
+
+    def return_solvetime(self):
+        return self.__solvetime
+
+
+if __name__ == "__main__":
+    random.seed(9999)
+    ac_schedule = Scheduler(nflights=80)
+    decomposition = TerminalDecomposition(ac_schedule, backend="highs", time_cliques=True)
+    print(decomposition.return_objective(), decomposition.return_iterations())
@@ -0,0 +1,84 @@
+"""
+Compact turn records
+A Turn holds one flight in __slots__ and is shared by the schedule, the turns and the FULL long turns, the A/P/D
+splits of a long turn are views that derive their window from it, so nothing is copied and a moved flight moves
+all its splits
+"""
+from collections.abc import Mapping
+from datetime import timedelta
+
+# length of the arrival and departure splits of a long turn
+SPLIT = timedelta(minutes=30)
+
+
+class Turn(Mapping):
+    __slots__ = ("AC", "ETA", "ETD", "ter", "tow", "pref")
+
+    def __init__(self, AC: str, ETA, ETD, ter: str, tow: bool = None, pref: dict = None):
+        self.AC = AC
+        self.ETA = ETA
+        self.ETD = ETD
+        self.ter = ter
+        self.tow = tow
+        self.pref = pref
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            val = getattr(self, key)
+            if val is not None:
+                return val
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def __iter__(self):
+        return (key for key in self.__slots__ if getattr(self, key) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def update(self, **fields):
+        for key, val in fields.items():
+            setattr(self, key, val)
+
+
+class SplitTurn(Mapping):
+    # A (arrival), P (parked) or D (departure) part of a long turn, P carries no bay preference
+    __slots__ = ("turn", "part")
+
+    def __init__(self, turn: Turn, part: str):
+        self.turn = turn
+        self.part = part
+
+    @property
+    def ETA(self):
+        return self.turn.ETD - SPLIT if self.part == "D" else self.turn.ETA + SPLIT * (self.part == "P")
+
+    @property
+    def ETD(self):
+        return self.turn.ETA + SPLIT if self.part == "A" else self.turn.ETD - SPLIT * (self.part == "P")
+
+    def __getitem__(self, key):
+        if key == "ETA":
+            return self.ETA
+        if key == "ETD":
+            return self.ETD
+        if key == "pref" and self.part == "P":
+            raise KeyError(key)
+        return self.turn[key]
+
+    def __contains__(self, key):
+        return key in self.turn and (key != "pref" or self.part != "P")
+
+    def __iter__(self):
+        return (key for key in self.turn if key != "pref" or self.part != "P")
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
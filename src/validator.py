@@ -0,0 +1,170 @@
+"""
+Standalone check of a bay assignment
+Works on the turns, bays and variables of a run (Scheduler, LPSolver.return_data, the run JSON or a RunData)
+without the MILP: per-bay sorted sweeps for time and adjacency conflicts, compatibility, tow splits, coverage and
+the recomputed objective
+"""
+import json
+from datetime import datetime, timedelta
+
+from src.bay_assignment import turn_cost, base_flight
+from src.compat import ac_index
+from src.intervals import IntervalIndex
+
+
+def parse_time(value, form: str):
+    return datetime.strptime(value, form) if isinstance(value, str) else value
+
+
+def parse_tbuf(value):
+    # "0:15:00" as written by make_data_serializable, or a timedelta
+    if isinstance(value, str):
+        h, m, s = (float(v) for v in value.split(":"))
+        return timedelta(hours=h, minutes=m, seconds=s)
+    return value
+
+
+class Validator(object):
+    def __init__(self, turns: dict, lturns: dict, bays: dict, ac: dict, variables: dict, adj: dict,
+                 costs: tuple = None, tbuf: timedelta = None):
+        # costs: (tow costs, no bay costs, terminal penalty) as Scheduler.return_cost_data, no objective without
+        self.__turns = turns
+        self.__lturns = lturns
+        self.__map_turns = dict(turns, **lturns["FULL"], **lturns["SPLIT"])
+        self.__bays = bays
+        self.__ac = ac_index(ac)
+        self.__adj = adj
+        self.__costs = costs
+        self.__tbuf = timedelta(minutes=15) if tbuf is None else tbuf
+        self.__x = {str(i): (b['type'], int(b['id'])) for i, b in variables['x'].items()}
+        self.__w = {str(i) for i in variables['w']}
+        self.__y = {str(i) for i in variables['y']}
+
+        self.__violations = []
+        self.check_coverage()
+        self.check_bays()
+        self.check_overlaps()
+        self.__objective = None if costs is None else sum(self.flight_costs().values())
+
+    def violation(self, check: str, turns: list, bay: tuple = None):
+        self.__violations.append({"check": check, "turns": turns, "bay": None if bay is None else list(bay)})
+
+    def cat(self, turn: str):
+        return self.__ac[self.__map_turns[turn]["AC"]]["cat"]
+
+    def window(self, turn: str):
+        return self.__map_turns[turn]["ETA"] + self.__tbuf, self.__map_turns[turn]["ETD"] + self.__tbuf
+
+    def check_coverage(self):
+        # every flight is on one bay, towed (all three splits on a bay) or without a bay, exactly one of them
+        for f in self.__turns:
+            n = (f in self.__x) + (f in self.__y)
+            if n != 1 or f in self.__w:
+                self.violation("coverage", [f])
+        for l in self.__lturns["FULL"]:
+            towed = l in self.__w
+            n = (l in self.__x) + (l in self.__y) + towed
+            if n != 1:
+                self.violation("coverage", [l])
+            splits = [l + s for s in ["A", "P", "D"]]
+            if towed != all(s in self.__x for s in splits) or (not towed and any(s in self.__x for s in splits)):
+                self.violation("tow split", splits)
+            if self.__lturns["FULL"][l].get("tow") and not towed:
+                self.violation("tow required", [l])
+        for i in set(self.__x) | self.__w | self.__y:
+            if i not in self.__map_turns:
+                self.violation("unknown turn", [i])
+
+    def check_bays(self):
+        # aircraft category allowed on the bay, parked splits on remote bays, arrival/departure splits at a terminal
+        for i, (ter, k) in self.__x.items():
+            if i not in self.__map_turns:
+                continue
+            if ter not in self.__bays or k not in self.__bays[ter]:
+                self.violation("unknown bay", [i], (ter, k))
+            elif self.cat(i) not in self.__bays[ter][k]["cat"]:
+                self.violation("category", [i], (ter, k))
+            elif i in self.__lturns["SPLIT"] and (ter == "BUS") != i.endswith("P"):
+                self.violation("split bay", [i], (ter, k))
+
+    def check_overlaps(self):
+        # per bay: overlapping buffered windows, then every turn against the k+2 neighbour if adj.json restricts it
+        occupied = {}
+        for i, bay in self.__x.items():
+            if i in self.__map_turns and bay[0] in self.__bays and bay[1] in self.__bays[bay[0]]:
+                occupied.setdefault(bay, []).append(i)
+        index = {bay: IntervalIndex({i: self.window(i) for i in turns}) for bay, turns in occupied.items()}
+
+        for bay, turns in index.items():
+            for i1, i2 in turns.pairs():
+                if base_flight(i1) != base_flight(i2):
+                    self.violation("time", [i1, i2], bay)
+
+        for (ter, k), turns in index.items():
+            if (ter, k + 2) not in index:
+                continue
+            rules = self.__adj.get(ter, {}).get(self.__bays[ter][k]["size"], {}) \
+                .get(self.__bays[ter][k + 2]["size"], {})
+            for i1 in occupied[ter, k]:
+                for i2 in index[ter, k + 2].overlapping(*self.window(i1)):
+                    if base_flight(i1) != base_flight(i2) and self.cat(i2) in rules.get(self.cat(i1), []) \
+                            and self.cat(i1) in self.__bays[ter][k]["cat"] \
+                            and self.cat(i2) in self.__bays[ter][k + 2]["cat"]:
+                        self.violation("adjacency", [i1, i2], (ter, k))
+
+    def flight_costs(self):
+        # cost per flight as LPSolver.flight_costs
+        tow, nobay, ter_penalty = self.__costs
+        costs = {}
+        for i, (ter, k) in self.__x.items():
+            if i in self.__map_turns and ter in self.__bays and k in self.__bays[ter]:
+                cap = self.__ac[self.__map_turns[i]["AC"]]["cap"]
+                f = base_flight(i)
+                costs[f] = costs.get(f, 0) + turn_cost(i, self.__map_turns[i], cap, ter, k, self.__bays, ter_penalty)
+        for l in self.__w:
+            costs[l] = costs.get(l, 0) + tow[self.cat(l)]
+        for i in self.__y:
+            costs[i] = costs.get(i, 0) + nobay[self.cat(i)]
+        return costs
+
+    def valid(self):
+        return not self.__violations
+
+    def return_violations(self):
+        return self.__violations
+
+    def return_objective(self):
+        return self.__objective
+
+
+def validate_schedule(schedule, variables: dict, adj_file: str = r"./programdata/adj.json", tbuf: timedelta = None):
+    # assignment in solve() result format against a Scheduler or ScheduleView, e.g. heuristic or decomposition output
+    with open(adj_file, 'r') as file:
+        adj = json.load(file)
+    return Validator(schedule.return_turns(), schedule.return_lturns(), schedule.return_bays(),
+                     schedule.return_ac(), variables, adj, costs=schedule.return_cost_data(), tbuf=tbuf)
+
+
+def load_run(data, tbuf: timedelta = None):
+    # inputs of a run log as LPSolver.return_data, the saved run JSON or a RunData, keys and timestamps normalised
+    form = data['date_format']
+
+    def turns(records):
+        return {str(i): dict(r, ETA=parse_time(r["ETA"], form), ETD=parse_time(r["ETD"], form))
+                for i, r in records.items()}
+
+    if tbuf is None:
+        try:
+            tbuf = parse_tbuf(data['tbuf'])
+        except KeyError:
+            tbuf = None
+    return {"turns": turns(data['turns']),
+            "lturns": {"FULL": turns(data['lturns'].get("FULL", {})), "SPLIT": turns(data['lturns'].get("SPLIT", {}))},
+            "bays": {ter: {int(k): v for k, v in data['bays'][ter].items()} for ter in data['bays']},
+            "ac": data['ac'], "variables": data['variables'], "costs": data['schedule'].get('costs'), "tbuf": tbuf}
+
+
+def validate_run(data, adj_file: str = r"./programdata/adj.json", tbuf: timedelta = None):
+    with open(adj_file, 'r') as file:
+        adj = json.load(file)
+    return Validator(adj=adj, **load_run(data, tbuf))
@@ -0,0 +1,34 @@
+import json
+import os
+import random
+
+import pytest
+
+from src.bay_assignment import LPSolver
+from src.flight_schedule import Scheduler
+from src.validator import validate_schedule
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def tow_schedule(monkeypatch, tmp_path):
+    # the shipped features never force a tow, a copy with tow weight 0.3 gives three forced-tow long turns
+    monkeypatch.chdir(ROOT)
+    with open("./programdata/features.json", 'r') as file:
+        features = json.load(file)
+    for weights in features["weights"].values():
+        weights["tow"] = 0.3
+    feature_file = tmp_path / "features.json"
+    feature_file.write_text(json.dumps(features))
+    random.seed(23)
+    return Scheduler(nflights=30, feature_file=str(feature_file))
+
+
+def test_greedy_keeps_forced_tows(tow_schedule):
+    forced = [l for l, turn in tow_schedule.return_lturns()["FULL"].items() if turn.get("tow")]
+    assert forced
+    lp = LPSolver(nflights=30, schedule=tow_schedule, heuristic="only", backend="highs")
+    validator = validate_schedule(tow_schedule, lp.return_variables())
+    assert validator.return_violations() == []
+    assert all(int(l) in lp.return_variables()['w'] for l in forced)
@@ -0,0 +1,27 @@
+import os
+import random
+
+import pytest
+
+from src.bay_assignment import LPSolver
+from src.flight_schedule import Scheduler
+from src.matrix_model import MatrixModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def schedule(monkeypatch):
+    # the program data paths are relative to the repository root
+    monkeypatch.chdir(ROOT)
+    random.seed(2021)
+    return Scheduler(nflights=20)
+
+
+@pytest.mark.parametrize("time_cliques", [False, True])
+def test_matrix_model_matches_lpsolver(schedule, time_cliques):
+    reference = LPSolver(nflights=20, schedule=schedule, backend="highs", time_cliques=time_cliques)
+    model = MatrixModel(schedule=schedule, time_cliques=time_cliques)
+    model.solve()
+    assert reference.return_status() == "Optimal"
+    assert model.return_objective() == pytest.approx(reference.return_objective(), rel=1e-6)